@@ -14,15 +14,17 @@ def inspect_exr_channels(exr_path):
         return []
 
 def batch_inspect_exr_channels(input_folder):
+    # Channels come from the header catalog, which only re-reads files that changed since the last scan
+    from exr_catalog import open_catalog
     print(f"Inspecting EXR files in folder: {input_folder}")
-    for file_name in os.listdir(input_folder):
-        if file_name.endswith(".exr"):
-            file_path = os.path.join(input_folder, file_name)
-            channels = inspect_exr_channels(file_path)
-            print(f"File: {file_name}")
-            print(f"Channels: {channels}")
-            print()
+    catalog = open_catalog(input_folder)
+    for row in catalog.frames():
+        print(f"File: {os.path.basename(row['path'])}")
+        print(f"Channels: {row['channels']} ({row['pixel_type']}, {row['width']}x{row['height']})")
+        print()
+    catalog.close()
 
-# Example usage
-input_folder = r'I:\GDA\UnrealEngine\SyntheticCanopies\Saved\MovieRenders\Jul22'
-batch_inspect_exr_channels(input_folder)
+if __name__ == "__main__":
+    # Example usage
+    input_folder = r'I:\GDA\UnrealEngine\SyntheticCanopies\Saved\MovieRenders\Jul22'
+    batch_inspect_exr_channels(input_folder)
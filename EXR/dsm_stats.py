@@ -0,0 +1,125 @@
+"""
+Dataset-wide depth statistics for the DSM EXR frames, so every frame can be scaled with the same parameters.
+
+Each frame is decoded once, in a process pool, into its min, max, valid pixel count and a histogram on a fixed grid
+of HIST_BIN_WIDTH depth units; no frame is kept in memory. Frame results are cached in a sidecar (DSM_STATS_FILE in
+the render folder) keyed by size and mtime, so adding frames to a session only decodes the new ones. The frame
+results are merged into global and per-scene totals, where a scene is the shot frame_info reads from the file name.
+
+    stats = collect_dsm_stats(input_folder)
+    min_val, max_val = scale_range(stats)                     # global
+    min_val, max_val = scale_range(stats, '56_750417__56_349583')  # one scene
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from exr_convert import frame_info, read_channels, depth_channels, DSM_CHANNELS, CONVERT_WORKERS, PROGRESS_EVERY
+
+DSM_STATS_FILE = 'dsm_stats.json'
+HIST_BIN_WIDTH = 100.0  # Depth units per histogram bin (Unreal renders in cm, so 1 m)
+
+def empty_stats():
+    return {'min': None, 'max': None, 'count': 0, 'hist_start': 0, 'hist': []}
+
+def frame_stats(exr_path, channels):
+    """
+    Min, max, valid pixel count and histogram of one depth frame; non-finite pixels are ignored.
+    """
+    depth = read_channels(exr_path, channels)
+    depth = depth[..., 0] if len(channels) == 1 else depth.mean(axis=-1)
+    depth = depth[np.isfinite(depth)]
+    if depth.size == 0:
+        return empty_stats()
+    bins = np.floor(depth / HIST_BIN_WIDTH).astype(np.int64)
+    hist_start = int(bins.min())
+    return {'min': float(depth.min()), 'max': float(depth.max()), 'count': int(depth.size),
+            'hist_start': hist_start, 'hist': np.bincount(bins - hist_start).tolist()}
+
+def merge_stats(total, part):
+    """
+    Add one frame's (or scene's) statistics to a running total.
+    """
+    if part['count'] == 0:
+        return total
+    if total['count'] == 0:
+        return dict(part)
+    start = min(total['hist_start'], part['hist_start'])
+    end = max(total['hist_start'] + len(total['hist']), part['hist_start'] + len(part['hist']))
+    hist = np.zeros(end - start, dtype=np.int64)
+    for stats in (total, part):
+        offset = stats['hist_start'] - start
+        hist[offset:offset + len(stats['hist'])] += np.asarray(stats['hist'], dtype=np.int64)
+    return {'min': min(total['min'], part['min']), 'max': max(total['max'], part['max']),
+            'count': total['count'] + part['count'], 'hist_start': start, 'hist': hist.tolist()}
+
+def load_stats(stats_file):
+    if os.path.exists(stats_file):
+        with open(stats_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_stats(stats_file, stats):
+    temp_file = stats_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(stats, f)
+    os.replace(temp_file, stats_file)
+
+def collect_dsm_stats(input_folder, stats_file=None, channels=DSM_CHANNELS, workers=CONVERT_WORKERS):
+    """
+    Statistics of every DSM frame in input_folder, decoding only frames that are new or changed since the sidecar
+    was written. Returns {'global': stats, 'scenes': {scene: stats}, 'frames': {file_name: stats}}.
+    """
+    stats_file = stats_file or os.path.join(input_folder, DSM_STATS_FILE)
+    previous = load_stats(stats_file)
+    cached = previous.get('frames', {}) if previous.get('bin_width') == HIST_BIN_WIDTH else {}
+
+    frames = {}
+    todo = []
+    for file_name in sorted(os.listdir(input_folder)):
+        info = frame_info(file_name)
+        if info is None or info[0] != 'DSM':
+            continue
+        stat = os.stat(os.path.join(input_folder, file_name))
+        entry = cached.get(file_name)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            # The scene is taken from the name again, so sidecars written with another scene key stay usable
+            frames[file_name] = dict(entry, scene=info[2])
+        else:
+            todo.append((file_name, info[2], stat))
+    print(f"DSM statistics: {len(frames) + len(todo)} frames, {len(frames)} cached, {len(todo)} to scan")
+
+    if todo:
+        if channels is None:
+            channels = depth_channels(os.path.join(input_folder, todo[0][0]))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(frame_stats, os.path.join(input_folder, file_name), channels):
+                       (file_name, shot, stat) for file_name, shot, stat in todo}
+            for done, future in enumerate(as_completed(futures), start=1):
+                file_name, shot, stat = futures[future]
+                try:
+                    frames[file_name] = {'size': stat.st_size, 'mtime': stat.st_mtime,
+                                         'scene': shot, **future.result()}
+                except Exception as e:
+                    print(f"Error reading DSM file {file_name}: {e}")
+                if done % PROGRESS_EVERY == 0:
+                    print(f"Progress: {done}/{len(todo)} frames scanned")
+
+    totals = empty_stats()
+    scenes = {}
+    for entry in frames.values():
+        part = {key: entry[key] for key in ('min', 'max', 'count', 'hist_start', 'hist')}
+        totals = merge_stats(totals, part)
+        scenes[entry['scene']] = merge_stats(scenes.get(entry['scene'], empty_stats()), part)
+    stats = {'bin_width': HIST_BIN_WIDTH, 'global': totals, 'scenes': scenes, 'frames': frames}
+    if todo or frames != cached:
+        save_stats(stats_file, stats)
+    print(f"DSM range: {totals['min']} to {totals['max']} over {len(scenes)} scenes")
+    return stats
+
+def scale_range(stats, scene=None):
+    """
+    The (min, max) to scale frames with: the global range, or the range of one scene.
+    """
+    totals = stats['global'] if scene is None else stats['scenes'][scene]
+    return totals['min'], totals['max']
@@ -0,0 +1,218 @@
+"""
+Header-only catalog of the EXR frames in a render folder.
+
+Every frame gets one row in an SQLite file (EXR_CATALOG_FILE in the render folder) with its path, size, mtime, pass
+type, frame id, dimensions, channels, pixel type and compression, read from the header in a process pool without
+decoding any pixels. A frame is marked incomplete when its chunk offset table points past the end of the file, which
+is what an interrupted render or copy leaves behind. Only new or changed files are read again on later scans.
+
+    python exr_catalog.py "I:\\...\\MovieRenders\\Jul22"            # scan and summarise
+    python exr_catalog.py "I:\\...\\MovieRenders\\Jul22" unpaired
+    python exr_catalog.py "I:\\...\\MovieRenders\\Jul22" incomplete
+"""
+import argparse
+import json
+import os
+import sqlite3
+import struct
+from concurrent.futures import ProcessPoolExecutor
+import OpenEXR
+from exr_convert import frame_info, CONVERT_WORKERS
+
+EXR_CATALOG_FILE = 'exr_catalog.sqlite'
+BUSY_TIMEOUT = 300
+HEADER_CHUNKSIZE = 64  # Headers read per task; each read is a few kB
+
+COLUMNS = ['path', 'size', 'mtime', 'pass_type', 'frame_id', 'width', 'height', 'channels', 'pixel_type',
+           'compression', 'complete', 'error']
+
+# Scanlines per chunk for each compression, from the OpenEXR file layout
+LINES_PER_CHUNK = {'NO_COMPRESSION': 1, 'RLE_COMPRESSION': 1, 'ZIPS_COMPRESSION': 1, 'ZIP_COMPRESSION': 16,
+                   'PIZ_COMPRESSION': 32, 'PXR24_COMPRESSION': 16, 'B44_COMPRESSION': 32, 'B44A_COMPRESSION': 32,
+                   'DWAA_COMPRESSION': 32, 'DWAB_COMPRESSION': 256}
+
+def read_string(f):
+    value = b''
+    while True:
+        char = f.read(1)
+        if not char:
+            raise ValueError("Header ends early")
+        if char == b'\0':
+            return value
+        value += char
+
+def header_end(f):
+    """
+    Skip the magic number, version and attribute list of a single-part file; returns the version flags.
+    """
+    magic, version = struct.unpack('<ii', f.read(8))
+    if magic != 20000630:
+        raise ValueError("Not an OpenEXR file")
+    while read_string(f):
+        read_string(f)
+        size, = struct.unpack('<i', f.read(4))
+        f.seek(size, os.SEEK_CUR)
+    return version
+
+def chunks_complete(exr_path, height, compression):
+    """
+    Whether every scanline chunk in the offset table lies inside the file, without reading the pixel data.
+    Tiled and multi-part files, whose tables are laid out differently, are left to OpenEXR's isComplete().
+    """
+    file_size = os.path.getsize(exr_path)
+    with open(exr_path, 'rb') as f:
+        version = header_end(f)
+        if version & 0x1200 or compression not in LINES_PER_CHUNK:
+            return None
+        count = -(-height // LINES_PER_CHUNK[compression])
+        table = f.read(8 * count)
+        if len(table) < 8 * count:
+            return False
+        offsets = struct.unpack(f'<{count}Q', table)
+        if min(offsets) == 0 or max(offsets) + 8 > file_size:
+            return False
+        f.seek(max(offsets))
+        _, data_size = struct.unpack('<ii', f.read(8))
+        return max(offsets) + 8 + data_size <= file_size
+
+def read_header(exr_path):
+    """
+    The catalog fields of one frame, from its header only.
+    """
+    record = {'path': exr_path}
+    try:
+        exr_file = OpenEXR.InputFile(exr_path)
+        try:
+            header = exr_file.header()
+            data_window = header['dataWindow']
+            record['width'] = data_window.max.x - data_window.min.x + 1
+            record['height'] = data_window.max.y - data_window.min.y + 1
+            record['compression'] = str(header['compression'])
+            complete = chunks_complete(exr_path, record['height'], record['compression'])
+            if complete is None:
+                complete = exr_file.isComplete()
+        finally:
+            exr_file.close()
+        channels = header['channels']
+        record['channels'] = json.dumps(sorted(channels))
+        record['pixel_type'] = ','.join(sorted({str(channel.type) for channel in channels.values()}))
+        record['complete'] = int(bool(complete))
+    except Exception as e:
+        record['complete'] = 0
+        record['error'] = str(e)
+    return record
+
+class ExrCatalog:
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS frames ('
+                                    'path TEXT PRIMARY KEY, size INTEGER, mtime REAL, pass_type TEXT, frame_id TEXT, '
+                                    'width INTEGER, height INTEGER, channels TEXT, pixel_type TEXT, compression TEXT, '
+                                    'complete INTEGER, error TEXT)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS frames_frame ON frames (frame_id, pass_type)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS frames_complete ON frames (complete)')
+
+    def scan(self, input_folder, workers=CONVERT_WORKERS):
+        """
+        Bring the catalog up to date with the render passes in input_folder; returns the number of headers read.
+        """
+        input_folder = os.path.abspath(input_folder)
+        known = {row['path']: (row['size'], row['mtime'])
+                 for row in self.connection.execute('SELECT path, size, mtime FROM frames')}
+        found = {}
+        todo = []
+        with os.scandir(input_folder) as entries:
+            for entry in entries:
+                info = frame_info(entry.name)
+                if info is None or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                found[entry.path] = (stat.st_size, stat.st_mtime, info)
+                if known.get(entry.path) != (stat.st_size, stat.st_mtime):
+                    todo.append(entry.path)
+
+        rows = []
+        if todo:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for record in executor.map(read_header, todo, chunksize=HEADER_CHUNKSIZE):
+                    size, mtime, info = found[record['path']]
+                    record.update(size=size, mtime=mtime, pass_type=info[0], frame_id=info[1])
+                    rows.append(tuple(record.get(column) for column in COLUMNS))
+        gone = [(path,) for path in known if path.startswith(os.path.join(input_folder, '')) and path not in found]
+        with self.connection:
+            self.connection.executemany(f"INSERT OR REPLACE INTO frames ({', '.join(COLUMNS)}) "
+                                        f"VALUES ({', '.join('?' for _ in COLUMNS)})", rows)
+            self.connection.executemany('DELETE FROM frames WHERE path = ?', gone)
+        print(f"EXR catalog: {len(found)} frames, {len(todo)} headers read, {len(gone)} removed")
+        return len(todo)
+
+    def frames(self, pass_type=None):
+        if pass_type is None:
+            return self.connection.execute('SELECT * FROM frames ORDER BY frame_id, pass_type').fetchall()
+        return self.connection.execute('SELECT * FROM frames WHERE pass_type = ? ORDER BY frame_id',
+                                       (pass_type,)).fetchall()
+
+    def pairs(self):
+        """
+        {frame_id: {'RGB': path, 'DSM': path}} for frames whose two passes are both complete. Both passes come from
+        the same render (date and time in the file name); when a shot was rendered more than once, the latest render
+        with both passes complete is used.
+        """
+        renders = {}
+        for row in self.connection.execute('SELECT frame_id, pass_type, path FROM frames WHERE complete = 1 '
+                                           'ORDER BY path'):
+            render = frame_info(os.path.basename(row['path']))[3]
+            renders.setdefault(row['frame_id'], {}).setdefault(render, {})[row['pass_type']] = row['path']
+        pairs = {}
+        for frame_id in sorted(renders):
+            complete = [render for render, passes in renders[frame_id].items() if {'RGB', 'DSM'} <= set(passes)]
+            if complete:
+                pairs[frame_id] = renders[frame_id][max(complete)]
+        return pairs
+
+    def unpaired(self):
+        return self.connection.execute(
+            'SELECT * FROM frames f WHERE NOT EXISTS (SELECT 1 FROM frames o WHERE o.frame_id = f.frame_id '
+            'AND o.pass_type != f.pass_type) ORDER BY frame_id').fetchall()
+
+    def incomplete(self):
+        return self.connection.execute('SELECT * FROM frames WHERE complete = 0 ORDER BY frame_id').fetchall()
+
+    def summary(self):
+        return dict(self.connection.execute('SELECT pass_type, COUNT(*) FROM frames GROUP BY pass_type').fetchall())
+
+    def close(self):
+        self.connection.close()
+
+def open_catalog(input_folder, catalog_file=None, workers=CONVERT_WORKERS):
+    """
+    Open the catalog of a render folder and bring it up to date.
+    """
+    catalog = ExrCatalog(catalog_file or os.path.join(input_folder, EXR_CATALOG_FILE))
+    catalog.scan(input_folder, workers)
+    return catalog
+
+def print_rows(rows):
+    for row in rows:
+        print('  '.join(f"{column}={row[column]}" for column in COLUMNS if row[column] is not None))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan EXR headers into a catalog and query it")
+    parser.add_argument('input_folder')
+    parser.add_argument('command', nargs='?', default='summary', choices=['summary', 'frames', 'unpaired', 'incomplete'])
+    parser.add_argument('--catalog', default=None)
+    args = parser.parse_args()
+
+    catalog = open_catalog(args.input_folder, args.catalog)
+    if args.command == 'frames':
+        print_rows(catalog.frames())
+    elif args.command == 'unpaired':
+        print_rows(catalog.unpaired())
+    elif args.command == 'incomplete':
+        print_rows(catalog.incomplete())
+    print(f"{len(catalog.pairs())} complete pairs, {catalog.summary()}")
+    catalog.close()
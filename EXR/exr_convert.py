@@ -0,0 +1,270 @@
+"""
+Parallel conversion of Movie Render Queue EXR frames into RGB/DSM training pairs.
+
+The PathTracer RGB frame and the AbsoluteZPosition-DEPTH frame of a shot share a base name. Pairs are planned from
+the header catalog (exr_catalog.py), which leaves out truncated frames, and every pair is decoded
+and written by one task in a process pool, with the output format picked from WRITERS (tif, png or npy). Outputs
+are written to a .part file and renamed, so a pair whose outputs exist is complete and is skipped on the next run.
+
+The depth pass stores the same value in R, G and B, so DSM frames decode a single channel: either DSM_CHANNELS, or
+the one channel found by checking the first frame of the batch. They are written as stretched uint16 or as raw
+float32 depth (dsm_dtype). The uint16 stretch uses each frame's own min/max by default, or with dsm_scale='global'
+or 'scene' the range from dsm_stats.py, so a depth maps to the same value in every frame; the ranges used are kept in
+DSM_SCALE_FILE next to the DSM outputs.
+
+    convert_exr_pairs(input_folder, output_folder_rgb, output_folder_dsm, writer='tif')
+"""
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import OpenEXR
+import Imath
+import numpy as np
+from CheckChannelsEXR import inspect_exr_channels
+
+# The PNG encoder is shared with the DEM tilers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'USGS-Machine-to-Machine'))
+from png_encoder import encode_png, DEFAULT_PNG_OPTIONS
+
+RGB_MARKER = 'PathTracer'
+DSM_MARKER = 'AbsoluteZPosition-DEPTH'
+DATE_TIME_FIELD = re.compile(r'^\d{4}\.\d{2}\.\d{2}$|^\d{2}\.\d{2}\.\d{2}$')
+RGB_CHANNELS = ['R', 'G', 'B']
+DSM_CHANNELS = None  # e.g. ['R'] as listed by CheckChannelsEXR; None checks the first DSM frame of each batch
+DSM_DTYPES = ['uint16', 'float32']
+DSM_SCALES = ['frame', 'scene', 'global']
+DSM_SCALE_FILE = 'dsm_scale.json'
+CONVERT_WORKERS = os.cpu_count()  # Each worker holds a couple of full float32 frames
+PROGRESS_EVERY = 100  # Pairs between progress lines
+
+def frame_info(file_name):
+    """
+    Return ('RGB' or 'DSM', base_name, shot, render) for a rendered frame, or None if the name is not a render pass.
+
+    Movie Render Queue names frames '<date> - <time> - <shot> - <pass>[.<frame>].exr', where the pass field contains
+    RGB_MARKER or DSM_MARKER. The base name is the shot, with _<frame> appended when there is one so the frames of a
+    sequence get their own outputs; the date and time are dropped if present, so names without them (or with extra
+    ' - ' fields) still pair up. The shot is the base name without the frame number, and the render is the date and
+    time fields ('' if there are none), which are the same for every pass of one render.
+    """
+    stem, ext = os.path.splitext(file_name)
+    if ext.lower() != '.exr':
+        return None
+    head, _, frame = stem.rpartition('.')
+    if head and frame.isdigit():
+        stem = head
+    else:
+        frame = None
+    parts = [part.strip() for part in stem.split(' - ')]
+    pass_index = next((idx for idx in range(len(parts) - 1, -1, -1)
+                       if RGB_MARKER in parts[idx] or DSM_MARKER in parts[idx]), None)
+    if pass_index is None:
+        return None
+    pass_name = parts[pass_index]
+    fields = [part for part in parts[:pass_index] if not DATE_TIME_FIELD.match(part)]
+    if not fields:
+        # '<shot>_PathTracer...' with no separator before the pass
+        cut = min(pass_name.index(marker) for marker in (RGB_MARKER, DSM_MARKER) if marker in pass_name)
+        fields = [pass_name[:cut].strip(' _-.')]
+    shot = ' - '.join(fields)
+    if not shot:
+        return None
+    base_name = shot if frame is None else f"{shot}_{frame}"
+    render = ' - '.join(part for part in parts[:pass_index] if DATE_TIME_FIELD.match(part))
+    return ('DSM' if DSM_MARKER in pass_name else 'RGB'), base_name, shot, render
+
+def read_channels(exr_path, channels):
+    """
+    Decode the given channels of an EXR file as a float32 array of shape (height, width, len(channels)).
+    """
+    exr_file = OpenEXR.InputFile(exr_path)
+    try:
+        data_window = exr_file.header()['dataWindow']
+        width = data_window.max.x - data_window.min.x + 1
+        height = data_window.max.y - data_window.min.y + 1
+        pt = Imath.PixelType(Imath.PixelType.FLOAT)
+        planes = exr_file.channels(channels, pt)
+    finally:
+        exr_file.close()
+    image = np.empty((height, width, len(channels)), dtype=np.float32)
+    for idx, plane in enumerate(planes):
+        image[..., idx] = np.frombuffer(plane, dtype=np.float32).reshape((height, width))
+    return image
+
+def to_uint16(image):
+    # NaN (no depth hit) becomes 0 instead of an undefined cast
+    return (np.nan_to_num(np.clip(image, 0, 1)) * 65535).astype(np.uint16)
+
+def decode_rgb(exr_path):
+    return to_uint16(read_channels(exr_path, RGB_CHANNELS))
+
+def depth_channels(exr_path):
+    """
+    The channels to decode for a depth frame: the only channel if there is one, a single one of R, G and B if they
+    hold identical values, otherwise all three (averaged by decode_dsm).
+    """
+    channels = sorted(inspect_exr_channels(exr_path))
+    if len(channels) == 1:
+        return channels
+    if not set(RGB_CHANNELS) <= set(channels):
+        raise ValueError(f"{exr_path} has no R, G and B channels: {channels}; set DSM_CHANNELS")
+    image = read_channels(exr_path, RGB_CHANNELS)
+    if (np.array_equal(image[..., 0], image[..., 1], equal_nan=True)
+            and np.array_equal(image[..., 0], image[..., 2], equal_nan=True)):
+        return RGB_CHANNELS[:1]
+    return RGB_CHANNELS
+
+def decode_dsm(exr_path, channels=RGB_CHANNELS, dtype='uint16', value_range=None):
+    """
+    Depth from the given channels (averaged if more than one), as float32 or stretched to uint16 over value_range
+    (min, max), which defaults to the frame's own min/max.
+    """
+    depth = read_channels(exr_path, channels)
+    depth = depth[..., 0] if len(channels) == 1 else depth.mean(axis=-1)
+    if dtype == 'float32':
+        return depth
+    min_val, max_val = value_range if value_range is not None else (np.nanmin(depth), np.nanmax(depth))
+    return to_uint16((depth - min_val) / (max_val - min_val) if max_val > min_val else np.zeros_like(depth))
+
+def write_tiff(f, image):
+    import tifffile
+    tifffile.imwrite(f, image, photometric='rgb' if image.ndim == 3 else 'minisblack')
+
+def write_png(f, image):
+    """
+    16-bit PNG through png_encoder's numpy backend, which (unlike Pillow) can write 16-bit RGB.
+    """
+    if image.dtype == np.float32:
+        raise ValueError("PNG cannot store float32 depth; use the tif or npy writer")
+    f.write(encode_png(image, {**DEFAULT_PNG_OPTIONS, 'backend': 'numpy'}))
+
+def write_npy(f, image):
+    np.save(f, image)
+
+WRITERS = {'tif': write_tiff, 'png': write_png, 'npy': write_npy}
+
+def write_image(path, image, writer):
+    temp_path = path + '.part'
+    with open(temp_path, 'wb') as f:
+        WRITERS[writer](f, image)
+    os.replace(temp_path, path)
+
+def convert_pair(base_name, rgb_path, dsm_path, rgb_output, dsm_output, writer, dsm_channels, dsm_dtype,
+                 dsm_range=None):
+    """
+    Convert the frames of one pair whose output is missing; returns the number of frames written.
+    """
+    written = 0
+    if not os.path.exists(rgb_output):
+        write_image(rgb_output, decode_rgb(rgb_path), writer)
+        written += 1
+    if not os.path.exists(dsm_output):
+        write_image(dsm_output, decode_dsm(dsm_path, dsm_channels, dsm_dtype, dsm_range), writer)
+        written += 1
+    return written
+
+def dsm_ranges(input_folder, output_folder_dsm, pairs, dsm_scale, dsm_channels):
+    """
+    The (min, max) each pair's depth is stretched over, from the dataset statistics. Pairs whose scene has no
+    statistics (its frames could not be read, or hold no valid depth) are left out. Warns when DSM outputs written
+    earlier used a different range, since they would have to be converted again to match.
+    """
+    from dsm_stats import collect_dsm_stats, scale_range
+    stats = collect_dsm_stats(input_folder, channels=dsm_channels)
+    if dsm_scale == 'global':
+        ranges = {'*': list(scale_range(stats))}
+    else:
+        ranges = {scene: list(scale_range(stats, scene)) for scene in stats['scenes']}
+    ranges = {key: value for key, value in ranges.items() if None not in value}
+
+    scale_file = os.path.join(output_folder_dsm, DSM_SCALE_FILE)
+    if os.path.exists(scale_file):
+        with open(scale_file, 'r') as f:
+            previous = json.load(f)
+        changed = sorted(key for key, value in previous.get('ranges', {}).items() if ranges.get(key) != value)
+        if previous.get('scale') != dsm_scale or changed:
+            print(f"Warning: the DSM range changed for {changed or dsm_scale}; delete those DSM outputs to rescale them")
+    temp_file = scale_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump({'scale': dsm_scale, 'ranges': ranges}, f, indent=1)
+    os.replace(temp_file, scale_file)
+    keys = {base_name: '*' if dsm_scale == 'global' else frame_info(os.path.basename(frame['DSM']))[2]
+            for base_name, frame in pairs.items()}
+    return {base_name: tuple(ranges[key]) for base_name, key in keys.items() if key in ranges}
+
+def find_pairs(input_folder, workers=CONVERT_WORKERS):
+    """
+    Pair the frames in a folder by base name using the header catalog (exr_catalog.py); returns
+    ({base_name: {'RGB': path, 'DSM': path}}, unpaired paths, incomplete paths). Incomplete frames are left out of
+    the pairs.
+    """
+    from exr_catalog import open_catalog
+    catalog = open_catalog(input_folder, workers=workers)
+    try:
+        pairs = catalog.pairs()
+        unpaired = [row['path'] for row in catalog.unpaired()]
+        incomplete = [row['path'] for row in catalog.incomplete()]
+    finally:
+        catalog.close()
+    return pairs, unpaired, incomplete
+
+def convert_exr_pairs(input_folder, output_folder_rgb, output_folder_dsm, writer='tif', workers=CONVERT_WORKERS,
+                      dsm_channels=DSM_CHANNELS, dsm_dtype='uint16', dsm_scale='frame'):
+    """
+    Convert every RGB/DSM pair in input_folder that has not been converted yet. Returns the failed base names.
+    """
+    if writer not in WRITERS:
+        raise ValueError(f"Unknown writer {writer!r}, expected one of {sorted(WRITERS)}")
+    if dsm_dtype not in DSM_DTYPES:
+        raise ValueError(f"Unknown DSM dtype {dsm_dtype!r}, expected one of {DSM_DTYPES}")
+    if dsm_scale not in DSM_SCALES:
+        raise ValueError(f"Unknown DSM scale {dsm_scale!r}, expected one of {DSM_SCALES}")
+    if writer == 'png' and dsm_dtype == 'float32':
+        raise ValueError("PNG cannot store float32 depth; use the tif or npy writer")
+    os.makedirs(output_folder_rgb, exist_ok=True)
+    os.makedirs(output_folder_dsm, exist_ok=True)
+    print(f"Starting batch processing in folder: {input_folder}")
+    pairs, unpaired, incomplete = find_pairs(input_folder, workers)
+    for path in unpaired:
+        print(f"Skipping unpaired frame: {os.path.basename(path)}")
+    for path in incomplete:
+        print(f"Skipping incomplete frame: {os.path.basename(path)}")
+
+    jobs = []
+    for base_name, frame in pairs.items():
+        rgb_output = os.path.join(output_folder_rgb, f"{base_name}_RGB.{writer}")
+        dsm_output = os.path.join(output_folder_dsm, f"{base_name}_DSM.{writer}")
+        if not (os.path.exists(rgb_output) and os.path.exists(dsm_output)):
+            jobs.append((base_name, frame['RGB'], frame['DSM'], rgb_output, dsm_output, writer))
+    print(f"{len(pairs)} pairs, {len(pairs) - len(jobs)} already converted, {len(jobs)} to convert")
+    if jobs and dsm_channels is None:
+        dsm_channels = depth_channels(jobs[0][2])
+    if jobs:
+        print(f"Decoding depth from channel(s) {dsm_channels} as {dsm_dtype}")
+    ranges = None
+    skipped = []
+    if pairs and dsm_dtype == 'uint16' and dsm_scale != 'frame':
+        # Also run when every pair is converted, so a changed range is still reported
+        ranges = dsm_ranges(input_folder, output_folder_dsm, pairs, dsm_scale, dsm_channels)
+        skipped = [job[0] for job in jobs if job[0] not in ranges]
+        for base_name in skipped:
+            print(f"Skipping pair {base_name}: no DSM statistics for its {dsm_scale} range")
+        jobs = [job for job in jobs if job[0] in ranges]
+    jobs = [job + (dsm_channels, dsm_dtype, ranges.get(job[0]) if ranges is not None else None) for job in jobs]
+
+    failed = list(skipped)
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_pair, *job): job[0] for job in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                written += future.result()
+            except Exception as e:
+                print(f"Error processing pair {futures[future]}: {e}")
+                failed.append(futures[future])
+            if done % PROGRESS_EVERY == 0:
+                print(f"Progress: {done}/{len(jobs)} pairs")
+    print(f"Batch processing completed: {written} frames written, {len(failed)} pairs failed.")
+    return failed
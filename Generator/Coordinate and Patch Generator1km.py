@@ -1,48 +1,28 @@
-import random
-import requests
-from geopy.distance import geodesic
+import argparse
+import numpy as np
+from patch_sampler import load_land_mask, patch_corners, write_patches
 
-def generate_random_coordinates():
-    lat = random.uniform(-90, 90)
-    lon = random.uniform(-180, 180)
-    return lat, lon
-
-def is_on_land(lat, lon):
-    url = f'https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}&zoom=10'
-    response = requests.get(url)
-    data = response.json()
-    if 'error' in data or 'address' not in data:
-        return False
-    return 'country' in data['address']
+PATCH_HALF_EXTENT = 500  # Metres from the centre to each side of the 1 sq-km patch
 
 def get_1sqkm_patch(lat, lon):
-    center = (lat, lon)
-    point_1km_north = geodesic(meters=500).destination(center, 0)
-    point_1km_east = geodesic(meters=500).destination(center, 90)
-    point_1km_south = geodesic(meters=500).destination(center, 180)
-    point_1km_west = geodesic(meters=500).destination(center, 270)
-    return {
-        'center': center,
-        'north': point_1km_north,
-        'east': point_1km_east,
-        'south': point_1km_south,
-        'west': point_1km_west
-    }
+    corners = patch_corners(np.array([lat]), np.array([lon]), PATCH_HALF_EXTENT)
+    patch = {'center': (lat, lon)}
+    for name, (corner_lat, corner_lon) in corners.items():
+        patch[name] = (float(corner_lat[0]), float(corner_lon[0]))
+    return patch
 
 def main():
-    valid_coordinates = False
-    while not valid_coordinates:
-        lat, lon = generate_random_coordinates()
-        if is_on_land(lat, lon):
-            valid_coordinates = True
-            patch = get_1sqkm_patch(lat, lon)
-            print(f'1 sq-km patch center: {patch["center"]}')
-            print(f'North point: {patch["north"]}')
-            print(f'East point: {patch["east"]}')
-            print(f'South point: {patch["south"]}')
-            print(f'West point: {patch["west"]}')
-        else:
-            print(f'Coordinates {lat}, {lon} are not on land. Generating new coordinates.')
+    # Land is checked against a local mask instead of a Nominatim request per point, so patches are generated offline
+    parser = argparse.ArgumentParser(description="Generate random 1 sq-km patches on land")
+    parser.add_argument('land_mask', help="Land mask raster (non-zero is land) or GeoJSON of land polygons")
+    parser.add_argument('-n', '--count', type=int, default=1000, help="Number of patches")
+    parser.add_argument('-o', '--output', default='patches_1km.csv')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--corners-on-land', action='store_true', help="Require the four corners on land as well")
+    args = parser.parse_args()
+
+    land_mask = load_land_mask(args.land_mask)
+    write_patches(args.output, args.count, PATCH_HALF_EXTENT, land_mask, args.seed, args.corners_on_land)
 
 if __name__ == "__main__":
     main()
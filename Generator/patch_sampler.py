@@ -0,0 +1,173 @@
+"""
+Offline sampling of training patch locations on land.
+
+Points are drawn in batches of BATCH_SIZE, uniformly by area, and tested against a land mask loaded once: either a
+raster in geographic coordinates (non-zero, non-nodata pixels are land) or a GeoJSON of land polygons. The patch
+corners are computed for the whole batch with a vectorized Vincenty direct solution on WGS84, which agrees with
+geopy's geodesic().destination to well under a millimetre at patch distances.
+
+    mask = load_land_mask(r"D:\\GIS\\ne_10m_land.geojson")
+    write_patches("patches.csv", 100000, 500, mask)
+"""
+import csv
+import json
+import numpy as np
+
+BATCH_SIZE = 100000  # Points drawn per batch
+MAX_LATITUDE = 85.0  # Patches are kept away from the poles
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+CORNERS = [('north', 0.0), ('east', 90.0), ('south', 180.0), ('west', 270.0)]
+
+class RasterLandMask:
+    """
+    Land mask from a raster in geographic coordinates, read into memory once.
+    """
+    def __init__(self, path):
+        import rasterio
+        with rasterio.open(path) as src:
+            self.mask = src.read(1)
+            nodata = src.nodata
+            self.inverse = ~src.transform
+        self.mask = (self.mask != 0) if nodata is None else (self.mask != 0) & (self.mask != nodata)
+
+    def contains(self, lat, lon):
+        cols, rows = self.inverse * (lon, lat)
+        rows = np.floor(rows).astype(np.int64)
+        cols = np.floor(cols).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.mask.shape[0]) & (cols >= 0) & (cols < self.mask.shape[1])
+        land = np.zeros(lat.shape, dtype=bool)
+        land[inside] = self.mask[rows[inside], cols[inside]]
+        return land
+
+class PolygonLandMask:
+    """
+    Land mask from the polygons of a GeoJSON file (e.g. Natural Earth land), merged and prepared once.
+    """
+    def __init__(self, path):
+        import shapely
+        from shapely.geometry import shape
+        with open(path, 'r') as f:
+            data = json.load(f)
+        features = data['features'] if data.get('type') == 'FeatureCollection' else [data]
+        self.land = shapely.union_all([shape(feature.get('geometry', feature)) for feature in features])
+        shapely.prepare(self.land)
+
+    def contains(self, lat, lon):
+        import shapely
+        return shapely.contains_xy(self.land, lon, lat)
+
+def load_land_mask(path):
+    if path.lower().endswith(('.json', '.geojson')):
+        return PolygonLandMask(path)
+    return RasterLandMask(path)
+
+def random_points(rng, count, max_latitude=MAX_LATITUDE):
+    """
+    count points spread uniformly over the sphere's area between +-max_latitude.
+    """
+    limit = np.sin(np.radians(max_latitude))
+    lat = np.degrees(np.arcsin(rng.uniform(-limit, limit, count)))
+    lon = rng.uniform(-180, 180, count)
+    return lat, lon
+
+def destination(lat, lon, bearing, distance):
+    """
+    Vincenty's direct solution on WGS84 for arrays of start points: the (lat, lon) reached after `distance` metres
+    on `bearing` degrees.
+    """
+    alpha1 = np.radians(bearing)
+    sin_alpha1 = np.sin(alpha1)
+    cos_alpha1 = np.cos(alpha1)
+    tan_u1 = (1 - WGS84_F) * np.tan(np.radians(lat))
+    cos_u1 = 1 / np.sqrt(1 + tan_u1 ** 2)
+    sin_u1 = tan_u1 * cos_u1
+    sigma1 = np.arctan2(tan_u1, cos_alpha1)
+    sin_alpha = cos_u1 * sin_alpha1
+    cos_sq_alpha = 1 - sin_alpha ** 2
+    u_sq = cos_sq_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+
+    sigma = distance / (WGS84_B * big_a)
+    for _ in range(100):
+        cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+        sin_sigma = np.sin(sigma)
+        cos_sigma = np.cos(sigma)
+        delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        previous = sigma
+        sigma = distance / (WGS84_B * big_a) + delta_sigma
+        if np.all(np.abs(sigma - previous) < 1e-12):
+            break
+
+    sin_sigma = np.sin(sigma)
+    cos_sigma = np.cos(sigma)
+    cos_2sigma_m = np.cos(2 * sigma1 + sigma)
+    tmp = sin_u1 * sin_sigma - cos_u1 * cos_sigma * cos_alpha1
+    lat2 = np.arctan2(sin_u1 * cos_sigma + cos_u1 * sin_sigma * cos_alpha1,
+                      (1 - WGS84_F) * np.sqrt(sin_alpha ** 2 + tmp ** 2))
+    lam = np.arctan2(sin_sigma * sin_alpha1, cos_u1 * cos_sigma - sin_u1 * sin_sigma * cos_alpha1)
+    c = WGS84_F / 16 * cos_sq_alpha * (4 + WGS84_F * (4 - 3 * cos_sq_alpha))
+    big_l = lam - (1 - c) * WGS84_F * sin_alpha * (
+        sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+    lon2 = (lon + np.degrees(big_l) + 180) % 360 - 180
+    return np.degrees(lat2), lon2
+
+def patch_corners(lat, lon, half_extent):
+    """
+    The north, east, south and west points half_extent metres from each centre, as {name: (lat, lon)} arrays.
+    """
+    return {name: destination(lat, lon, np.full(lat.shape, bearing), half_extent) for name, bearing in CORNERS}
+
+def sample_patches(count, half_extent, land_mask, seed=None, corners_on_land=False, batch_size=BATCH_SIZE):
+    """
+    Yield batches of patches on land until count have been produced. Each batch is a dict of arrays: center_lat,
+    center_lon and <corner>_lat, <corner>_lon for the four corners. With corners_on_land the four corners must be on
+    land too, which keeps patches off the coastline.
+    """
+    rng = np.random.default_rng(seed)
+    produced = 0
+    drawn = 0
+    on_land = 0
+    while produced < count:
+        lat, lon = random_points(rng, batch_size)
+        drawn += batch_size
+        keep = land_mask.contains(lat, lon)
+        on_land += int(keep.sum())
+        lat, lon = lat[keep], lon[keep]
+        corners = patch_corners(lat, lon, half_extent)
+        if corners_on_land:
+            keep = np.ones(lat.shape, dtype=bool)
+            for corner_lat, corner_lon in corners.values():
+                keep &= land_mask.contains(corner_lat, corner_lon)
+            lat, lon = lat[keep], lon[keep]
+            corners = {name: (corner_lat[keep], corner_lon[keep]) for name, (corner_lat, corner_lon) in corners.items()}
+        take = min(len(lat), count - produced)
+        batch = {'center_lat': lat[:take], 'center_lon': lon[:take]}
+        for name, (corner_lat, corner_lon) in corners.items():
+            batch[f'{name}_lat'] = corner_lat[:take]
+            batch[f'{name}_lon'] = corner_lon[:take]
+        produced += take
+        if produced == 0 and drawn >= 100 * batch_size:
+            raise ValueError(f"No land found in {drawn} points; check the land mask")
+        print(f"Patches: {produced}/{count} ({drawn} points drawn, {on_land / drawn:.1%} on land)")
+        yield batch
+
+def write_patches(output_file, count, half_extent, land_mask, seed=None, corners_on_land=False):
+    """
+    Write count patches to a CSV file, one row per patch.
+    """
+    columns = ['center_lat', 'center_lon'] + [f'{name}_{axis}' for name, _ in CORNERS for axis in ('lat', 'lon')]
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id'] + columns)
+        patch_id = 0
+        for batch in sample_patches(count, half_extent, land_mask, seed, corners_on_land):
+            rows = np.column_stack([batch[column] for column in columns])
+            for row in rows:
+                writer.writerow([patch_id] + [f'{value:.8f}' for value in row])
+                patch_id += 1
+    print(f"Wrote {patch_id} patches to {output_file}")
@@ -1,10 +1,62 @@
+"""
+Clip each of the ~30,000 squares in a shapefile out of the DEM scenes.
+
+All scenes are mosaicked through one VRT (as MERGE DEM.py does), so a square spanning scene boundaries comes out as
+one seamless clip instead of being overwritten by whichever scene was warped last. Squares are clipped from that
+VRT in parallel worker processes, each opening it once, and finished squares are recorded in CLIP_LEDGER_FILE so a
+stopped run picks up where it left off.
+"""
 import os
-import glob
+import time
+from functools import partial
 import fiona
 from shapely.geometry import shape
 from osgeo import gdal
+from scene_footprints import SceneFootprints, FOOTPRINT_CACHE
+from tile_ledger import TileLedger
+from tile_pipeline import BoundedProcessPool
+
+CLIP_LEDGER_FILE = 'clip_ledger.sqlite'  # Finished squares per shapefile
+VRT_FILE = 'scenes.vrt'  # Written to the output directory; worker processes cannot see a /vsimem VRT
+CLIP_WORKERS = os.cpu_count() or 1
+QUEUE_DEPTH = 256  # Squares in flight before the main process waits
+WORKER_GDAL_CACHE_MB = 64  # GDAL block cache per clip worker
+PROGRESS_EVERY = 500  # Squares between progress messages
+
+worker_vrt = None  # Mosaic VRT opened once per worker process
+
+def build_mosaic_vrt(scene_paths, vrt_path):
+    """
+    Write a VRT mosaicking the scenes. Sources are listed in path order, so where scenes overlap the later one wins.
+    """
+    vrt = gdal.BuildVRT(vrt_path, scene_paths)
+    if vrt is None:
+        raise RuntimeError(f"Failed to create VRT {vrt_path}")
+    projection = vrt.GetProjection()
+    vrt = None  # Flushes the VRT to disk
+    return projection
 
-def clip_dem_with_squares(squares_shapefile, dem_directory, output_directory):
+def init_clip_worker(vrt_path):
+    global worker_vrt
+    gdal.SetCacheMax(WORKER_GDAL_CACHE_MB * 1024 * 1024)
+    worker_vrt = gdal.Open(vrt_path)
+
+def clip_square(bounds, output_file, projection):
+    """
+    Clip one square from the worker's mosaic VRT. The clip is written to a temporary name and renamed when complete,
+    so an interrupted run never leaves a truncated clip that looks finished.
+    """
+    temp_file = output_file + '.tmp'
+    if os.path.exists(temp_file):
+        os.remove(temp_file)  # gdal.Warp would warp into a leftover file instead of replacing it
+    result = gdal.Warp(temp_file, worker_vrt, format="GTiff", outputBounds=list(bounds), dstSRS=projection)
+    if result is None:
+        raise RuntimeError(f"gdal.Warp failed for {output_file}")
+    result = None
+    os.replace(temp_file, output_file)
+
+def clip_dem_with_squares(squares_shapefile, dem_directory, output_directory, footprint_cache=FOOTPRINT_CACHE,
+                          clip_workers=CLIP_WORKERS, queue_depth=QUEUE_DEPTH):
     # Read the squares from the shapefile
     with fiona.open(squares_shapefile, 'r') as src:
         squares = [shape(feature['geometry']) for feature in src]
@@ -17,45 +69,70 @@ def clip_dem_with_squares(squares_shapefile, dem_directory, output_directory):
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
 
-    # Get list of all .bil files in the DEM directory
-    dem_files = glob.glob(os.path.join(dem_directory, '*.bil'))
+    # Index the bounds of all .bil files in the DEM directory (not its subfolders), reusing the cached bounds of
+    # unchanged scenes
+    footprints = SceneFootprints.build(dem_directory, footprint_cache, recursive=False)
 
-    if not dem_files:
+    if not len(footprints):
         print("No .bil files found in the DEM directory.")
         return
 
-    # Iterate over each square and clip the intersecting DEM files
-    for i, square in enumerate(squares):
-        # Get the bounding box of the square
-        minx, miny, maxx, maxy = square.bounds
-        print(f"Processing square {i+1}/{len(squares)}: {minx}, {miny}, {maxx}, {maxy}")
-
-        # Find intersecting DEM files
-        for dem_file in dem_files:
-            dem_ds = gdal.Open(dem_file)
-            dem_transform = dem_ds.GetGeoTransform()
-            dem_projection = dem_ds.GetProjection()
-
-            # Get DEM boundaries
-            dem_minx = dem_transform[0]
-            dem_maxx = dem_transform[0] + dem_transform[1] * dem_ds.RasterXSize
-            dem_miny = dem_transform[3] + dem_transform[5] * dem_ds.RasterYSize
-            dem_maxy = dem_transform[3]
-
-            # Check if the DEM file intersects with the square
-            if dem_minx < maxx and dem_maxx > minx and dem_miny < maxy and dem_maxy > miny:
-                print(f"Clipping {dem_file}...")
-
-                # Clip the DEM file
-                output_file = os.path.join(output_directory, f"clipped_square_{i+1}.tif")
-                gdal.Warp(output_file, dem_file, format="GTiff",
-                          outputBounds=[minx, miny, maxx, maxy],
-                          dstSRS=dem_projection)
+    vrt_path = os.path.join(output_directory, VRT_FILE)
+    print(f"Building mosaic VRT over {len(footprints)} scenes: {vrt_path}")
+    projection = build_mosaic_vrt([scene['path'] for scene in footprints.scenes], vrt_path)
+
+    ledger = TileLedger(CLIP_LEDGER_FILE)
+    ledger.start_scene(squares_shapefile, len(squares))
+    completed = ledger.completed_tiles(squares_shapefile)
+    print(f"{len(completed)}/{len(squares)} squares already clipped according to {CLIP_LEDGER_FILE}")
+
+    counts = {'clipped': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+    start_time = time.time()
+
+    def finished(future):
+        if future.exception() is not None:
+            counts['failed'] += 1
+            print(f"Failed clipping: {future.exception()}")
+            return
+        counts['clipped'] += 1
+        if counts['clipped'] % PROGRESS_EVERY == 0:
+            rate = counts['clipped'] / (time.time() - start_time)
+            print(f"Clipped {counts['clipped']} squares ({rate:.1f} squares/s)")
+
+    with BoundedProcessPool(clip_workers, queue_depth, initializer=init_clip_worker, initargs=(vrt_path,)) as pool:
+        for i, square in enumerate(squares):
+            square_id = str(i + 1)
+            if square_id in completed:
+                continue
+
+            # Get the bounding box of the square
+            minx, miny, maxx, maxy = square.bounds
+            output_file = os.path.join(output_directory, f"clipped_square_{i+1}.tif")
+
+            if os.path.exists(output_file):
+                counts['skipped'] += 1
+                ledger.mark_tile(squares_shapefile, square_id)
+                continue
+
+            # Squares over no scene (e.g. open ocean) would only produce an all-NoData clip
+            if not footprints.query(minx, miny, maxx, maxy):
+                counts['empty'] += 1
+                ledger.mark_tile(squares_shapefile, square_id)
+                continue
+
+            future = pool.submit(clip_square, (minx, miny, maxx, maxy), output_file, projection,
+                                 on_success=partial(ledger.mark_tile, squares_shapefile, square_id), task_id=square_id)
+            future.add_done_callback(finished)
 
+    if counts['failed'] == 0:
+        ledger.mark_scene_done(squares_shapefile)
+    ledger.close()
+    print(f"Clipped {counts['clipped']} squares, skipped {counts['skipped']} existing, {counts['empty']} outside all scenes, "
+          f"{counts['failed']} failed in {time.time() - start_time:.1f}s")
     print("Clipping completed.")
 
 if __name__ == "__main__":
     squares_shapefile = r"C:\Users\giegi\OneDrive - The Ohio State University\Qin\W6\30KSquares.shp"  # Change this to your shapefile containing the squares
     dem_directory = r"J:\GDA\GIS\LandsatEXTRACT"  # Change this to your DEM files directory
     output_directory = r"J:\GDA\GIS\Landsat30KClips"  # Change this to your desired output directory
-    clip_dem_with_squares(squares_shapefile, dem_directory, output_directory)
\ No newline at end of file
+    clip_dem_with_squares(squares_shapefile, dem_directory, output_directory)
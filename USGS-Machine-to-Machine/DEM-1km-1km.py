@@ -6,57 +6,139 @@ import os
 from osgeo import gdal
 import numpy as np
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from raster_strips import iter_strips, fill_nodata, track_peak_memory
+from tile_ledger import TileLedger
+from scene_catalog import list_scenes
+from tile_writers import DEFAULT_GTIFF_OPTIONS, write_geotiff
 
-CHECKPOINT_FILE = 'checkpoint.json'
+LEDGER_FILE = 'tile_ledger.sqlite'  # Completed squares per scene; replaces the old checkpoint.json counters
+MANIFEST_FILE = 'manifest.json'
 MAX_WORKERS = 8  # Adjust this based on your system's capabilities
+STREAMING = True  # Read one row-strip of squares at a time instead of the whole band
+# Scenes tiled in parallel, one process (and GDAL context) each, plus SCENE_WRITE_WORKERS writer threads per scene; 1 runs
+# sequentially. Kept low because the scenes share one destination disk; override with DEM_SCENE_WORKERS
+SCENE_WORKERS = int(os.environ.get('DEM_SCENE_WORKERS', 2))
+SCENE_WRITE_WORKERS = 2  # GTiff writer threads per scene when scenes run in parallel
+WORKER_GDAL_CACHE_MB = 64  # GDAL block cache per scene worker, so N workers don't each claim the default 5% of RAM
+MANIFEST_SAVE_EVERY = 50  # Scenes between manifest saves in parallel mode
+FILL_VALUE = np.nan  # Written where the source is NoData
+FILL_DTYPE = np.float32  # Working dtype of each read window; matches the Float32 GTiffs
+# Compression, predictor, tiling, overviews, COG and Float32/Int16-scaled output; see benchmark_gtiff_options.py.
+# e.g. {'compress': 'ZSTD', 'level': 9} or {'compress': 'DEFLATE', 'data_type': 'Int16'}
+GTIFF_OPTIONS = dict(DEFAULT_GTIFF_OPTIONS)
 
-def load_checkpoint():
-    if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE, 'r') as f:
+scene_ledger = None  # Per-process ledger connection used by scene workers
+
+def load_manifest():
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, 'r') as f:
             return json.load(f)
-    return {'current_file': 0, 'current_square': 0}
+    return {}
 
-def save_checkpoint(current_file, current_square):
-    with open(CHECKPOINT_FILE, 'w') as f:
-        json.dump({'current_file': current_file, 'current_square': current_square}, f)
+def save_manifest(manifest):
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=1)
 
-def bil_to_geotiff(source_directory, destination_directory, square_size_km=1):
+def bil_to_geotiff(source_directory, destination_directory, square_size_km=1, streaming=STREAMING, scene_workers=SCENE_WORKERS,
+                   gtiff_options=GTIFF_OPTIONS):
     # Ensure destination directory exists
     if not os.path.exists(destination_directory):
         os.makedirs(destination_directory)
     
-    checkpoint = load_checkpoint()
-    current_file = checkpoint['current_file']
-    current_square = checkpoint['current_square']
-
-    all_files = [os.path.join(root, file)
-                 for root, _, files in os.walk(source_directory)
-                 for file in files if file.endswith('.bil')]
+    # Extracted .bil files or .bil members of the downloaded zips, read through /vsizip/
+    all_files = list_scenes(source_directory)
 
     total_files = len(all_files)
+    manifest = load_manifest()
+
+    ledger = TileLedger(LEDGER_FILE)
+    ledger.register_scenes(all_files)
+    done_scenes = ledger.completed_scenes()
+    todo = [(idx, file_path) for idx, file_path in enumerate(all_files) if file_path not in done_scenes]
+    print(f"{total_files - len(todo)}/{total_files} files already finished according to {LEDGER_FILE}")
+
+    if scene_workers > 1:
+        ledger.close()
+        process_scenes_parallel(todo, total_files, destination_directory, square_size_km, scene_workers, manifest, gtiff_options)
+        return
 
-    for idx, file_path in enumerate(all_files[current_file:], start=current_file):
+    for idx, file_path in todo:
         print(f"Processing file {idx + 1}/{total_files}: {file_path}")
-        process_bil_file(file_path, destination_directory, square_size_km, idx, current_square)
-        current_square = 0  # Reset square count after each file
-        current_file = idx + 1
-        save_checkpoint(current_file, current_square)
+        start_time = time.time()
+        if streaming:
+            result = process_bil_file_streaming(file_path, destination_directory, square_size_km, ledger, gtiff_options=gtiff_options)
+        else:
+            result = process_bil_file(file_path, destination_directory, square_size_km, ledger, gtiff_options=gtiff_options)
+        if result is not None:
+            result['seconds'] = round(time.time() - start_time, 2)
+            manifest[file_path] = result
+            save_manifest(manifest)
         print(f"Finished processing {file_path}")
+    ledger.close()
+
+def init_scene_worker():
+    global scene_ledger
+    # Each worker process gets its own GDAL context; keep its block cache small since there are many of them
+    gdal.SetCacheMax(WORKER_GDAL_CACHE_MB * 1024 * 1024)
+    scene_ledger = TileLedger(LEDGER_FILE)
+
+def process_scene(file_path, destination_directory, square_size_km, file_idx, gtiff_options=GTIFF_OPTIONS):
+    """
+    Tile one scene inside a worker process and return its manifest entry.
+    """
+    worker = os.getpid()
+    print(f"[worker {worker}] Processing file {file_idx + 1}: {file_path}")
+    start_time = time.time()
+    result = process_bil_file_streaming(file_path, destination_directory, square_size_km, scene_ledger,
+                                        max_workers=SCENE_WRITE_WORKERS, gtiff_options=gtiff_options)
+    if result is None:
+        result = {'failed': True}
+    result['worker'] = worker
+    result['seconds'] = round(time.time() - start_time, 2)
+    print(f"[worker {worker}] Finished {file_path} in {result['seconds']:.1f}s")
+    return result
+
+def process_scenes_parallel(todo, total_files, destination_directory, square_size_km, scene_workers, manifest, gtiff_options=GTIFF_OPTIONS):
+    """
+    Fan scenes out across a process pool. Each worker records finished squares in its own ledger connection,
+    so an interrupted run resumes every scene where it stopped regardless of the order scenes finished in.
+    """
+    worker_counts = {}
+
+    with ProcessPoolExecutor(max_workers=scene_workers, initializer=init_scene_worker) as executor:
+        future_to_file = {}
+        for idx, file_path in todo:
+            future = executor.submit(process_scene, file_path, destination_directory, square_size_km, idx, gtiff_options)
+            future_to_file[future] = (idx, file_path)
 
-def process_square(subset, output_path, projection, geotransform, nodata):
-    driver = gdal.GetDriverByName('GTiff')
-    out_raster = driver.Create(output_path, subset.shape[1], subset.shape[0], 1, gdal.GDT_Float32)
-    out_raster.SetGeoTransform(geotransform)
-    out_raster.SetProjection(projection)
-    outband = out_raster.GetRasterBand(1)
-    outband.WriteArray(subset)
-    if nodata is not None:
-        outband.SetNoDataValue(nodata)
-    outband.FlushCache()
-    out_raster = None
-
-def process_bil_file(file_path, destination_directory, square_size_km, current_file_idx, start_square_idx):
+        for completed, future in enumerate(as_completed(future_to_file), start=1):
+            idx, file_path = future_to_file[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Failed processing {file_path}: {e}")
+                result = {'failed': True, 'error': str(e)}
+            manifest[file_path] = result
+            worker_counts[result.get('worker')] = worker_counts.get(result.get('worker'), 0) + 1
+
+            if completed % MANIFEST_SAVE_EVERY == 0:
+                save_manifest(manifest)
+            print(f"Finished {completed}/{len(todo)} scenes ({idx + 1}/{total_files}: {file_path})")
+
+    save_manifest(manifest)
+    for worker, count in sorted(worker_counts.items(), key=lambda item: str(item[0])):
+        print(f"Worker {worker}: {count} scenes")
+
+def process_square(subset, output_path, projection, geotransform, nodata, gtiff_options=GTIFF_OPTIONS):
+    write_geotiff(subset, output_path, projection, geotransform, nodata, gtiff_options)
+
+def process_square_recorded(ledger, scene, tile_id, subset, output_path, projection, geotransform, nodata, gtiff_options):
+    process_square(subset, output_path, projection, geotransform, nodata, gtiff_options)
+    ledger.mark_tile(scene, tile_id)
+
+def process_bil_file(file_path, destination_directory, square_size_km, ledger, gtiff_options=GTIFF_OPTIONS):
     dataset = gdal.Open(file_path)
     if dataset is None:
         print(f"Failed to open {file_path}")
@@ -66,7 +148,7 @@ def process_bil_file(file_path, destination_directory, square_size_km, current_f
     projection = dataset.GetProjection()
     band = dataset.GetRasterBand(1)
     nodata = band.GetNoDataValue()
-    data = band.ReadAsArray()
+    data = fill_nodata(band.ReadAsArray(), nodata, FILL_VALUE, FILL_DTYPE)
 
     cols = dataset.RasterXSize
     rows = dataset.RasterYSize
@@ -76,38 +158,46 @@ def process_bil_file(file_path, destination_directory, square_size_km, current_f
     pixels_per_square_x = int(square_size_deg / pixel_width)
     pixels_per_square_y = int(abs(square_size_deg / pixel_height))
     total_squares = (cols // pixels_per_square_x) * (rows // pixels_per_square_y)
-    current_square = start_square_idx
+    ledger.start_scene(file_path, total_squares)
+    completed = ledger.completed_tiles(file_path)
+    current_square = 0
+    written = 0
+    skipped = 0
 
     futures = []
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         for i in range(0, cols, pixels_per_square_x):
             for j in range(0, rows, pixels_per_square_y):
-                if current_square < start_square_idx:
-                    current_square += 1
-                    continue
-
                 min_lon = geotransform[0] + i * pixel_width
                 max_lat = geotransform[3] + j * pixel_height
                 center_lon = min_lon + (pixels_per_square_x * pixel_width) / 2
                 center_lat = max_lat + (pixels_per_square_y * pixel_height) / 2
 
-                filename = f"{center_lat:.6f}_{center_lon:.6f}.tif"
+                tile_id = f"{center_lat:.6f}_{center_lon:.6f}"
+                if tile_id in completed:
+                    current_square += 1
+                    continue
+
+                filename = f"{tile_id}.tif"
                 output_path = os.path.join(destination_directory, filename)
 
+                # Squares not in the ledger may still exist from an overlapping scene or a pre-ledger run
                 if os.path.exists(output_path):
                     print(f"Skipping existing file: {output_path}")
+                    skipped += 1
+                    ledger.mark_tile(file_path, tile_id)
                     current_square += 1
                     continue
 
                 subset = data[j:j + pixels_per_square_y, i:i + pixels_per_square_x]
-                if nodata is not None:
-                    subset[subset == nodata] = np.nan
 
                 if subset.size == 0:
                     continue
 
                 geotransform_subset = (min_lon, pixel_width, 0, max_lat, 0, pixel_height)
-                futures.append(executor.submit(process_square, subset, output_path, projection, geotransform_subset, nodata))
+                futures.append(executor.submit(process_square_recorded, ledger, file_path, tile_id,
+                                               subset, output_path, projection, geotransform_subset, nodata, gtiff_options))
+                written += 1
 
                 current_square += 1
 
@@ -116,12 +206,98 @@ def process_bil_file(file_path, destination_directory, square_size_km, current_f
                         future.result()
                     futures = []
 
-            save_checkpoint(current_file_idx, current_square)
             print(f"Processed {current_square}/{total_squares} squares from {file_path}")
 
         for future in as_completed(futures):
             future.result()
 
+    ledger.mark_scene_done(file_path)
+
+    return {'squares': total_squares, 'written': written, 'skipped': skipped}
+
+def process_bil_file_streaming(file_path, destination_directory, square_size_km, ledger, max_workers=MAX_WORKERS,
+                               gtiff_options=GTIFF_OPTIONS):
+    """
+    Same output as process_bil_file, but the band is read one row-strip of squares at a time.
+    At most two strips are in memory: the one being cut and the one whose squares are still being written.
+    """
+    dataset = gdal.Open(file_path)
+    if dataset is None:
+        print(f"Failed to open {file_path}")
+        return
+
+    geotransform = dataset.GetGeoTransform()
+    projection = dataset.GetProjection()
+    band = dataset.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+
+    cols = dataset.RasterXSize
+    rows = dataset.RasterYSize
+    pixel_width = geotransform[1]
+    pixel_height = geotransform[5]
+    square_size_deg = square_size_km / 111
+    pixels_per_square_x = int(square_size_deg / pixel_width)
+    pixels_per_square_y = int(abs(square_size_deg / pixel_height))
+    total_squares = (cols // pixels_per_square_x) * (rows // pixels_per_square_y)
+    squares_per_column = len(range(0, rows, pixels_per_square_y))
+    ledger.start_scene(file_path, total_squares)
+    completed = ledger.completed_tiles(file_path)
+    current_square = 0
+    written = 0
+    skipped = 0
+
+    previous_futures = []
+    with track_peak_memory(file_path) as memory, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for j, strip in iter_strips(band, pixels_per_square_y):
+            strip_idx = j // pixels_per_square_y
+            strip = fill_nodata(strip, nodata, FILL_VALUE, FILL_DTYPE)
+            futures = []
+            for i in range(0, cols, pixels_per_square_x):
+                min_lon = geotransform[0] + i * pixel_width
+                max_lat = geotransform[3] + j * pixel_height
+                center_lon = min_lon + (pixels_per_square_x * pixel_width) / 2
+                center_lat = max_lat + (pixels_per_square_y * pixel_height) / 2
+
+                tile_id = f"{center_lat:.6f}_{center_lon:.6f}"
+                if tile_id in completed:
+                    current_square += 1
+                    continue
+
+                filename = f"{tile_id}.tif"
+                output_path = os.path.join(destination_directory, filename)
+
+                # Squares not in the ledger may still exist from an overlapping scene or a pre-ledger run
+                if os.path.exists(output_path):
+                    print(f"Skipping existing file: {output_path}")
+                    skipped += 1
+                    ledger.mark_tile(file_path, tile_id)
+                    current_square += 1
+                    continue
+
+                subset = strip[:, i:i + pixels_per_square_x]
+
+                if subset.size == 0:
+                    continue
+
+                geotransform_subset = (min_lon, pixel_width, 0, max_lat, 0, pixel_height)
+                futures.append(executor.submit(process_square_recorded, ledger, file_path, tile_id,
+                                               subset, output_path, projection, geotransform_subset, nodata, gtiff_options))
+                written += 1
+
+                current_square += 1
+
+            # Wait for the previous strip's writes so it can be released before the next strip is read
+            for future in as_completed(previous_futures):
+                future.result()
+            previous_futures = futures
+            print(f"Processed strip {strip_idx + 1}/{squares_per_column} ({current_square}/{total_squares} squares) from {file_path}")
+
+        for future in as_completed(previous_futures):
+            future.result()
+
+    ledger.mark_scene_done(file_path)
+    return {'squares': total_squares, 'written': written, 'skipped': skipped, 'peak_memory_mib': memory['peak_memory_mib']}
+
 if __name__ == "__main__":
     source_directory = r"J:\GDA\GIS\LandsatEXTRACT"  # Change this to your source folder containing .bil files
     destination_directory = r"J:\GDA\GIS\LandsatDEM-1kmsq"  # Change this to your desired destination folder
@@ -1,62 +1,167 @@
-""" 
+"""
 This script extracts all the zip files from downloaded Landsat C2 DEM folder into a new folder.
 1. It checks if the file has already been extracted. This was necessary because some files were broken and had to be deleted, redownloaded, and extracted.
 2. It prints and logs each file that is being extracted.
 
-Make sure to change the source_directory and destination_directory to your source and destination folders. 
+Make sure to change the source_directory and destination_directory to your source and destination folders.
 
+The extraction directory is scanned once up front, and the members (with sizes) of each archive are kept in
+EXTRACT_MANIFEST_FILE there, so an unchanged archive is not reopened on later runs. Only members that are missing
+or have the wrong size are extracted, archives are extracted in parallel processes, and every member is written
+to a temporary name and renamed when complete.
 """
 import zipfile
 import os
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
+from download_catalog import DownloadCatalog, download_id_of
+
+EXTRACT_MANIFEST_FILE = 'extract_manifest.json'  # Kept in the extraction directory
+EXTRACT_WORKERS = os.cpu_count() or 1
+COPY_BUFFER = 8 * 1024 * 1024
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(path, manifest):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, path)
 
 def get_zip_contents(zip_file_path):
     """
-    Get the list of files in a zip file.
+    Get the files in a zip file and their uncompressed sizes.
     """
     with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-        return set(zip_ref.namelist())
+        return {info.filename: info.file_size for info in zip_ref.infolist() if not info.is_dir()}
 
 def get_extracted_contents(extract_to_path):
     """
-    Get the list of files in the extracted directory.
+    Get the files in the extracted directory and their sizes, in one walk.
     """
-    extracted_files = set()
+    extracted_files = {}
     for root, _, files in os.walk(extract_to_path):
         for file in files:
             # Get the relative path of the file with respect to the extraction directory
-            relative_path = os .path.relpath(os.path.join(root, file), extract_to_path)
-            extracted_files.add(relative_path)
+            file_path = os.path.join(root, file)
+            relative_path = os.path.relpath(file_path, extract_to_path).replace(os.sep, '/')
+            extracted_files[relative_path] = os.path.getsize(file_path)
     return extracted_files
 
-def is_already_extracted(zip_file_path, extract_to_path):
+def missing_members(zip_contents, extracted_contents):
     """
-    Check if the zip file contents already exist in the extraction directory.
+    Members that are not in the extraction directory, or are there with a different size.
     """
-    zip_contents = get_zip_contents(zip_file_path)
-    extracted_contents = get_extracted_contents(extract_to_path)
-    return zip_contents.issubset(extracted_contents)
+    return [name for name, size in zip_contents.items() if extracted_contents.get(name) != size]
 
-def extract_zip(zip_file_path, extract_to_path):
+def member_target(extract_to_path, name):
     """
-    Extract a zip file to the specified directory.
+    Destination of a member, refusing names that would land outside the extraction directory.
+    """
+    target = os.path.normpath(os.path.join(extract_to_path, name))
+    if os.path.commonpath([os.path.abspath(target), os.path.abspath(extract_to_path)]) != os.path.abspath(extract_to_path):
+        raise ValueError(f"Refusing to extract {name!r} outside {extract_to_path}")
+    return target
+
+def extract_zip(zip_file_path, extract_to_path, members=None):
+    """
+    Extract a zip file (or only the given members) to the specified directory.
+    Each member is written to a temporary file and renamed, so a stopped run never leaves a truncated file behind.
     """
     with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to_path)
+        for name in members if members is not None else zip_ref.namelist():
+            if name.endswith('/'):
+                continue
+            target = member_target(extract_to_path, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp_target = target + '.part'
+            with zip_ref.open(name) as source, open(temp_target, 'wb') as destination:
+                shutil.copyfileobj(source, destination, COPY_BUFFER)
+            os.replace(temp_target, target)
+    return zip_file_path
 
-def extract_zip_files(source_directory, extract_to_path):
+def extract_zip_files(source_directory, extract_to_path, extract_workers=EXTRACT_WORKERS, catalog=None):
     """
     Extract all zip files in the source directory to the specified directory.
-    Only extract if the contents are not already present.
+    Only extract members that are not already present.
     """
     zip_files = [os.path.join(root, file) for root, _, files in os.walk(source_directory) for file in files if file.endswith('.zip')]
-    
-    for zip_file_path in tqdm(zip_files, desc="Processing ZIP files"):
-        if not is_already_extracted(zip_file_path, extract_to_path):
-            print(f"\nExtracting {zip_file_path} to {extract_to_path}")
-            extract_zip(zip_file_path, extract_to_path)
-        else:
-            print(f"\n{zip_file_path} has already been extracted.")
+
+    manifest_path = os.path.join(extract_to_path, EXTRACT_MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    print(f"Scanning {extract_to_path}...")
+    extracted_contents = get_extracted_contents(extract_to_path)
+    print(f"{len(extracted_contents)} files already extracted")
+
+    todo = []
+    bad = []
+    for zip_file_path in tqdm(zip_files, desc="Checking ZIP files"):
+        stat = os.stat(zip_file_path)
+        key = os.path.relpath(zip_file_path, source_directory)
+        entry = manifest.get(key)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            # New or re-downloaded archive: read its member list once
+            try:
+                entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'members': get_zip_contents(zip_file_path)}
+            except zipfile.BadZipFile:
+                print(f"\nBad zip file, skipping: {zip_file_path}")
+                bad.append(zip_file_path)
+                continue
+            manifest[key] = entry
+
+        missing = missing_members(entry['members'], extracted_contents)
+        if missing:
+            todo.append((zip_file_path, missing))
+    save_manifest(manifest_path, manifest)
+    print(f"{len(zip_files) - len(todo) - len(bad)}/{len(zip_files)} archives already fully extracted, {len(bad)} bad")
+
+    # Archives the catalog already marks extracted are skipped; the rest are updated in one transaction
+    already_extracted = {row['download_id'] for row in catalog.by_status('extracted')} if catalog is not None else set()
+
+    def mark_extracted(zip_file_paths):
+        if catalog is None:
+            return
+        download_ids = {download_id_of(zip_file_path) for zip_file_path in zip_file_paths}
+        download_ids = sorted(download_ids - already_extracted - {None})
+        if download_ids:
+            catalog.set_status_many(download_ids, 'extracted')
+            already_extracted.update(download_ids)
+
+    # Bad archives are marked invalid so the downloader fetches them again
+    if catalog is not None:
+        bad_ids = sorted({download_id_of(zip_file_path) for zip_file_path in bad} - {None})
+        if bad_ids:
+            catalog.set_status_many(bad_ids, 'invalid')
+            already_extracted.difference_update(bad_ids)
+
+    pending = {zip_file_path for zip_file_path, _ in todo} | set(bad)
+    mark_extracted([zip_file_path for zip_file_path in zip_files if zip_file_path not in pending])
+
+    failures = []
+    extracted = []
+    with ProcessPoolExecutor(max_workers=extract_workers) as executor:
+        futures = {executor.submit(extract_zip, zip_file_path, extract_to_path, missing): (zip_file_path, missing)
+                   for zip_file_path, missing in todo}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Extracting ZIP files"):
+            zip_file_path, missing = futures[future]
+            try:
+                future.result()
+                extracted.append(zip_file_path)
+                print(f"\nExtracted {len(missing)} files from {zip_file_path} to {extract_to_path}")
+            except Exception as e:
+                failures.append(zip_file_path)
+                print(f"\nFailed extracting {zip_file_path}: {e}")
+    mark_extracted(extracted)
+    if failures:
+        print(f"{len(failures)} archives failed to extract:")
+        for zip_file_path in failures:
+            print(zip_file_path)
 
 if __name__ == "__main__":
     source_directory = r"J:\GDA\GIS\LandsatDOWNLOAD"  # Change this to your source directory containing zip files
@@ -65,4 +170,6 @@ if __name__ == "__main__":
     # Ensure the extract_to_path exists
     os.makedirs(extract_to_path, exist_ok=True)
 
-    extract_zip_files(source_directory, extract_to_path)
+    catalog = DownloadCatalog()
+    extract_zip_files(source_directory, extract_to_path, catalog=catalog)
+    catalog.close()
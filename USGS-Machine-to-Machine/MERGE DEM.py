@@ -1,10 +1,11 @@
 import os
-import glob
 from osgeo import gdal
+from scene_catalog import list_scenes
+from composite_pyramid import build_overviews, RESAMPLING
 
-def merge_images(source_directory, output_file):
-    # Get list of all .bil files in the source directory
-    file_list = glob.glob(os.path.join(source_directory, '*.bil'))
+def merge_images(source_directory, output_file, overview_resampling=RESAMPLING):
+    # Get list of all .bil files in the source directory (not its subfolders), extracted or inside the downloaded zips
+    file_list = list_scenes(source_directory, recursive=False)
     
     if not file_list:
         print("No .bil files found in the source directory.")
@@ -20,12 +21,18 @@ def merge_images(source_directory, output_file):
 
     # Translate the VRT to a final composite GeoTIFF
     print(f"Merging {len(file_list)} images into {output_file}...")
-    gdal.Translate(output_file, vrt, format='GTiff')
+    # Tiled so bounding-box reads of the composite and its overviews only touch the blocks they need
+    gdal.Translate(output_file, vrt, format='GTiff',
+                   creationOptions=['TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=YES', 'NUM_THREADS=ALL_CPUS'])
     
     # Clean up the virtual dataset
     vrt = None
     print(f"Composite image saved as {output_file}")
 
+    # Overview pyramid for coarse previews and sampling; see composite_pyramid.py
+    if overview_resampling:
+        build_overviews(output_file, resampling=overview_resampling)
+
 if __name__ == "__main__":
     source_directory = r"K:\GDA\GIS\LandsatEXTRACT"  # Change this to your source folder containing DTM images
     output_file = r"K:\GDA\GIS\LandsatDEM_composite_image.tif"  # Change this to your desired output file path
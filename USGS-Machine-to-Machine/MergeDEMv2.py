@@ -1,56 +1,183 @@
+"""
+Out-of-core mosaic of all .bil scenes into one tiled, compressed BigTIFF.
+
+The union extent of the scenes is computed from their headers and the output is created once. It is then filled
+one chunk of blocks at a time: worker processes read the part of every overlapping scene that falls in a chunk and
+composite it (the first scene in path order wins where scenes overlap, as rasterio.merge does by default), and
+the main process writes the finished chunk into its window. Memory is bounded by CHUNK_SIZE and QUEUE_DEPTH,
+not by the size of the mosaic, and chunks no scene touches are never written (they read back as NoData).
+"""
+import math
 import os
+import threading
+import time
+import numpy as np
 import rasterio
-from rasterio.merge import merge
-from rasterio.plot import show
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin
+from rasterio.windows import Window, from_bounds
 from tqdm import tqdm
+from tile_pipeline import BoundedProcessPool
+from scene_catalog import list_scenes
+
+BLOCK_SIZE = 512  # Internal tile size of the output GeoTIFF
+CHUNK_SIZE = 4096  # Pixels per side of the window composited by one worker task; a multiple of BLOCK_SIZE
+COMPRESS = 'DEFLATE'
+MERGE_WORKERS = os.cpu_count() or 1
+QUEUE_DEPTH = 2 * MERGE_WORKERS  # Chunks in flight; each holds CHUNK_SIZE**2 pixels
+DEFAULT_NODATA = -9999  # Used when the first scene has no NoData value
+
+worker_sources = None  # Scene paths, set once per worker process
+
+def read_headers(file_paths):
+    """
+    Return bounds, resolution, dtype, nodata and CRS of every scene, reading headers only.
+    """
+    headers = []
+    for file_path in tqdm(file_paths, desc="Reading .bil headers"):
+        with rasterio.open(file_path) as src:
+            headers.append({'path': file_path, 'bounds': tuple(src.bounds), 'res': src.res, 'dtype': src.dtypes[0],
+                            'nodata': src.nodata, 'crs': src.crs})
+    return headers
+
+def mosaic_grid(headers):
+    """
+    Union extent of the scenes on the first scene's pixel grid: (transform, width, height).
+    """
+    res_x, res_y = headers[0]['res']
+    mismatched = sum(1 for header in headers if not np.allclose(header['res'], (res_x, res_y)))
+    if mismatched:
+        print(f"Warning: {mismatched} scenes differ from the {res_x} x {res_y} resolution and will be resampled (nearest)")
+
+    left = min(header['bounds'][0] for header in headers)
+    bottom = min(header['bounds'][1] for header in headers)
+    right = max(header['bounds'][2] for header in headers)
+    top = max(header['bounds'][3] for header in headers)
+    width = int(math.ceil(round((right - left) / res_x, 6)))
+    height = int(math.ceil(round((top - bottom) / res_y, 6)))
+    return from_origin(left, top, res_x, res_y), width, height
+
+def chunk_sources(headers, transform, width, height, chunk_size):
+    """
+    Map each (chunk_row, chunk_col) to the indices of the scenes that overlap it, in path order.
+    """
+    chunks = {}
+    for idx, header in enumerate(headers):
+        window = from_bounds(*header['bounds'], transform=transform)
+        col_start = max(int(math.floor(window.col_off)), 0)
+        row_start = max(int(math.floor(window.row_off)), 0)
+        col_stop = min(int(math.ceil(window.col_off + window.width)), width)
+        row_stop = min(int(math.ceil(window.row_off + window.height)), height)
+        if col_stop <= col_start or row_stop <= row_start:
+            continue
+        for chunk_row in range(row_start // chunk_size, (row_stop - 1) // chunk_size + 1):
+            for chunk_col in range(col_start // chunk_size, (col_stop - 1) // chunk_size + 1):
+                chunks.setdefault((chunk_row, chunk_col), []).append(idx)
+    return chunks
+
+def init_merge_worker(source_paths):
+    global worker_sources
+    worker_sources = source_paths
+
+def composite_chunk(window, transform, source_indices, dtype, nodata):
+    """
+    Read every overlapping scene's part of the output window and composite them, first valid pixel wins.
+    """
+    height, width = int(window.height), int(window.width)
+    out = np.full((height, width), nodata, dtype=dtype)
+    filled = np.zeros((height, width), dtype=bool)
+    left, top = transform * (window.col_off, window.row_off)
+    res_x, res_y = transform.a, -transform.e
+
+    for idx in source_indices:
+        with rasterio.open(worker_sources[idx]) as src:
+            # Part of the chunk covered by this scene, in chunk pixel coordinates
+            src_left, src_bottom, src_right, src_top = src.bounds
+            col_start = max(int(round((src_left - left) / res_x)), 0)
+            col_stop = min(int(round((src_right - left) / res_x)), width)
+            row_start = max(int(round((top - src_top) / res_y)), 0)
+            row_stop = min(int(round((top - src_bottom) / res_y)), height)
+            if col_stop <= col_start or row_stop <= row_start:
+                continue
+
+            src_window = from_bounds(left + col_start * res_x, top - row_stop * res_y,
+                                     left + col_stop * res_x, top - row_start * res_y, transform=src.transform)
+            data = src.read(1, window=src_window, out_shape=(row_stop - row_start, col_stop - col_start),
+                            resampling=Resampling.nearest, masked=True)
 
-def merge_rasters(src_dir, output_path, batch_size=10):
-    # List to store the sources
-    src_files_to_mosaic = []
+        valid = ~np.ma.getmaskarray(data)
+        if np.issubdtype(data.dtype, np.floating):
+            valid &= ~np.isnan(data.data)
+        target = (slice(row_start, row_stop), slice(col_start, col_stop))
+        take = valid & ~filled[target]
+        out[target][take] = data.data[take]
+        filled[target] |= take
 
-    # Iterate through all the .bil files in the directory
-    for root, _, files in os.walk(src_dir):
-        for file in tqdm(files, desc="Reading .bil files"):
-            if file.endswith('.bil'):
-                file_path = os.path.join(root, file)
-                src = rasterio.open(file_path)
-                src_files_to_mosaic.append(src)
+        if filled.all():
+            break
+    return window, out
 
-                # Merge the rasters in batches
-                if len(src_files_to_mosaic) >= batch_size:
-                    mosaic, out_trans = merge(src_files_to_mosaic)
+def merge_rasters(src_dir, output_path, block_size=BLOCK_SIZE, chunk_size=CHUNK_SIZE, compress=COMPRESS,
+                  merge_workers=MERGE_WORKERS, queue_depth=QUEUE_DEPTH):
+    # Extracted .bil files or .bil members of the downloaded zips; rasterio opens /vsizip/ paths as GDAL does
+    file_paths = list_scenes(src_dir)
+    if not file_paths:
+        print("No .bil files found in the source directory.")
+        return
 
-                    # Copy the metadata from the first raster
-                    if len(src_files_to_mosaic) == batch_size:
-                        out_meta = src.meta.copy()
+    headers = read_headers(file_paths)
+    transform, width, height = mosaic_grid(headers)
+    dtype = headers[0]['dtype']
+    nodata = headers[0]['nodata'] if headers[0]['nodata'] is not None else DEFAULT_NODATA
+    chunks = chunk_sources(headers, transform, width, height, chunk_size)
+    print(f"Mosaic of {len(headers)} scenes: {width} x {height} pixels, {len(chunks)} chunks of {chunk_size} px with data")
 
-                    # Write the mosaic raster to disk
-                    with rasterio.open(output_path, "w", **out_meta) as dest:
-                        dest.write(mosaic)
+    profile = {
+        'driver': 'GTiff', 'width': width, 'height': height, 'count': 1, 'dtype': dtype, 'nodata': nodata,
+        'crs': headers[0]['crs'], 'transform': transform, 'tiled': True, 'blockxsize': block_size,
+        'blockysize': block_size, 'compress': compress, 'BIGTIFF': 'YES', 'SPARSE_OK': 'TRUE',
+    }
+    if compress:
+        profile['predictor'] = 3 if np.issubdtype(np.dtype(dtype), np.floating) else 2
 
-                    # Close all the open files
-                    for src in src_files_to_mosaic:
-                        src.close()
+    start_time = time.time()
+    with rasterio.open(output_path, 'w', **profile) as dest:
+        write_lock = threading.Lock()
+        progress = tqdm(total=len(chunks), desc="Writing chunks")
 
-                    # Clear the list for the next batch
-                    src_files_to_mosaic = []
+        errors = []
 
-    # Merge any remaining rasters
-    if len(src_files_to_mosaic) > 0:
-        mosaic, out_trans = merge(src_files_to_mosaic)
+        def write_chunk(result):
+            # Runs as a done-callback, where concurrent.futures would only log an exception, so write failures
+            # (full disk, GDAL errors) are collected with the worker failures
+            window, data = result
+            try:
+                with write_lock:
+                    dest.write(data, 1, window=window)
+                    progress.update(1)
+            except Exception as e:
+                errors.append((window, e))
 
-        # Write the mosaic raster to disk
-        with rasterio.open(output_path, "w", **out_meta) as dest:
-            dest.write(mosaic)
+        with BoundedProcessPool(merge_workers, queue_depth, initializer=init_merge_worker,
+                                initargs=(file_paths,)) as pool:
+            # Futures are not kept, so a written chunk's array is freed as soon as its callback returns
+            for (chunk_row, chunk_col), source_indices in sorted(chunks.items()):
+                row_off, col_off = chunk_row * chunk_size, chunk_col * chunk_size
+                window = Window(col_off, row_off, min(chunk_size, width - col_off), min(chunk_size, height - row_off))
+                future = pool.submit(composite_chunk, window, transform, source_indices, dtype, nodata,
+                                     on_result=write_chunk, task_id=f"chunk {chunk_row},{chunk_col}")
+                future.add_done_callback(lambda f, window=window: f.exception() and errors.append((window, f.exception())))
+        progress.close()
 
-        # Close all the open files
-        for src in src_files_to_mosaic:
-            src.close()
+    for window, error in errors:
+        print(f"Failed chunk {window}: {error}")
+    if errors:
+        raise RuntimeError(f"{len(errors)} chunks failed; {output_path} is incomplete")
 
-    print(f"Composite image saved to {output_path}")
+    print(f"Composite image saved to {output_path} in {time.time() - start_time:.1f}s")
 
 if __name__ == "__main__":
     src_dir = r"J:\GDA\GIS\LandsatEXTRACT"  # Directory containing the .bil files
     output_path = r"J:\GDA\GIS\LandsatDEM_composite_image.tif"  # Output path for the composite image
 
-    merge_rasters(src_dir, output_path, batch_size=10)
+    merge_rasters(src_dir, output_path)
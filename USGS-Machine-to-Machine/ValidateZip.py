@@ -1,6 +1,14 @@
+"""
+Check the downloaded zips. Files the downloader verified (size against Content-Length, SHA-256 while streaming)
+are recorded in its manifest and are only checked for a size change; only zips without a manifest entry, e.g.
+downloaded before the manifest existed, are deep-checked with testzip(), and are added to the manifest when valid.
+Results are also recorded in the download catalog, which M2M-Download-API reads to re-fetch invalid files.
+"""
 import zipfile
 import os
 import subprocess
+from m2m_downloader import DownloadManifest, MANIFEST_FILE
+from download_catalog import DownloadCatalog, download_id_of
 
 def is_valid_zip(file_path):
     try:
@@ -17,28 +25,39 @@ def is_valid_zip(file_path):
         print(f"An error occurred: {e}")
         return False
 
-def validate_zip_files(directory):
-    total_files = 0
+def validate_zip_files(directory, deep_check_all=False, catalog=None):
+    manifest = DownloadManifest(os.path.join(directory, MANIFEST_FILE))
+    zip_files = [os.path.join(root, file)
+                 for root, _, files in os.walk(directory)
+                 for file in files if file.endswith('.zip')]
+    total_files = len(zip_files)
+
     checked_files = 0
+    trusted_files = 0
     invalid_files = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.zip'):
-                total_files += 1
+    for file_path in zip_files:
+        checked_files += 1
+        if not deep_check_all and manifest.is_verified(file_path):
+            trusted_files += 1
+            continue
 
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.zip'):
-                file_path = os.path.join(root, file)
-                checked_files += 1
-                print(f"Checking file: {file_path}")
-                if not is_valid_zip(file_path):
-                    print(f"Invalid zip file: {file_path}")
-                    invalid_files.append(file_path)
-                    os.remove(file_path)
-                else:
-                    print(f"Valid zip file: {file_path}")
-                print(f"Progress: {checked_files}/{total_files} files checked")
+        print(f"Checking file: {file_path}")
+        if not is_valid_zip(file_path):
+            print(f"Invalid zip file: {file_path}")
+            invalid_files.append(file_path)
+            manifest.remove(os.path.basename(file_path))
+            os.remove(file_path)
+            if catalog is not None and download_id_of(file_path) is not None:
+                catalog.set_status(download_id_of(file_path), 'invalid')
+        else:
+            print(f"Valid zip file: {file_path}")
+            manifest.record(os.path.basename(file_path), os.path.getsize(file_path), verified='testzip')
+            if catalog is not None and download_id_of(file_path) is not None:
+                row = catalog.get(download_id_of(file_path))
+                if row is not None and row['status'] != 'extracted':
+                    catalog.set_status(row['download_id'], 'downloaded', os.path.getsize(file_path))
+        print(f"Progress: {checked_files}/{total_files} files checked")
+    print(f"{trusted_files}/{total_files} files verified at download time, {checked_files - trusted_files} deep-checked")
 
     if invalid_files:
         print("Invalid files found. Running M2M-Download-API...")
@@ -56,4 +75,6 @@ def run_download_script():
 
 if __name__ == "__main__":
     directory_to_check = r"J:\GDA\GIS\LandsatDOWNLOAD"  # Change this to the directory containing your zip files
-    validate_zip_files(directory_to_check)
\ No newline at end of file
+    catalog = DownloadCatalog()
+    validate_zip_files(directory_to_check, catalog=catalog)
+    catalog.close()
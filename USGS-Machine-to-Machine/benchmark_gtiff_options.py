@@ -0,0 +1,86 @@
+"""
+Measure output size and write throughput of GeoTIFF output modes on 1 km squares cut from sample .bil scenes,
+to choose GTIFF_OPTIONS in DEM-1km-1km.py. Point output_directory at the drive the real run writes to,
+since throughput on our slower external drives is part of what is being measured.
+"""
+import os
+import shutil
+import time
+import numpy as np
+from osgeo import gdal
+from raster_strips import iter_strips, fill_nodata
+from tile_writers import write_geotiff
+from scene_catalog import list_scenes
+
+SQUARES_PER_SCENE = 500  # Squares cut from each sample scene
+
+CANDIDATES = [
+    {},  # Today's uncompressed, striped Float32
+    {'compress': 'DEFLATE'},
+    {'compress': 'DEFLATE', 'level': 9},
+    {'compress': 'ZSTD', 'level': 9},
+    {'compress': 'ZSTD', 'level': 15},
+    {'compress': 'ZSTD', 'level': 9, 'tiled': True, 'block_size': 128},
+    {'compress': 'DEFLATE', 'data_type': 'Int16'},
+    {'compress': 'ZSTD', 'level': 9, 'data_type': 'Int16'},
+    {'compress': 'ZSTD', 'level': 9, 'cog': True},
+]
+
+def sample_squares(bil_files, square_size_km=1, squares_per_scene=SQUARES_PER_SCENE):
+    """
+    Cut squares the same way DEM-1km-1km.py does and return (subset, projection, geotransform, nodata) tuples.
+    """
+    squares = []
+    for file_path in bil_files:
+        dataset = gdal.Open(file_path)
+        if dataset is None:
+            print(f"Failed to open {file_path}")
+            continue
+        geotransform = dataset.GetGeoTransform()
+        projection = dataset.GetProjection()
+        band = dataset.GetRasterBand(1)
+        nodata = band.GetNoDataValue()
+        square_size_deg = square_size_km / 111
+        pixels_per_square_x = int(square_size_deg / geotransform[1])
+        pixels_per_square_y = int(abs(square_size_deg / geotransform[5]))
+
+        taken = 0
+        for j, strip in iter_strips(band, pixels_per_square_y):
+            strip = fill_nodata(strip, nodata, np.nan, np.float32)
+            for i in range(0, dataset.RasterXSize, pixels_per_square_x):
+                geotransform_subset = (geotransform[0] + i * geotransform[1], geotransform[1], 0,
+                                       geotransform[3] + j * geotransform[5], 0, geotransform[5])
+                squares.append((strip[:, i:i + pixels_per_square_x].copy(), projection, geotransform_subset, nodata))
+                taken += 1
+                if taken >= squares_per_scene:
+                    break
+            if taken >= squares_per_scene:
+                break
+    return squares
+
+def benchmark(squares, output_directory, candidates=CANDIDATES):
+    raw_bytes = sum(subset.nbytes for subset, _, _, _ in squares)
+    print(f"{len(squares)} squares, {raw_bytes / (1024 * 1024):.1f} MiB of Float32 pixels")
+    print(f"{'options':<70} {'squares/s':>10} {'MiB':>9} {'KiB/sq':>8} {'vs raw':>7}")
+    for options in candidates:
+        run_directory = os.path.join(output_directory, 'gtiff_benchmark')
+        shutil.rmtree(run_directory, ignore_errors=True)
+        os.makedirs(run_directory)
+
+        start = time.perf_counter()
+        for idx, (subset, projection, geotransform, nodata) in enumerate(squares):
+            write_geotiff(subset, os.path.join(run_directory, f"{idx}.tif"), projection, geotransform, nodata, options)
+        elapsed = time.perf_counter() - start
+
+        written_bytes = sum(entry.stat().st_size for entry in os.scandir(run_directory))
+        print(f"{str(options):<70} {len(squares) / elapsed:10.1f} {written_bytes / (1024 * 1024):9.2f} "
+              f"{written_bytes / 1024 / len(squares):8.1f} {written_bytes / raw_bytes:7.2f}")
+        shutil.rmtree(run_directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    source_directory = r"J:\GDA\GIS\LandsatEXTRACT"  # Change this to your source folder containing .bil files
+    output_directory = r"J:\GDA\GIS"  # A scratch folder on the drive the tiles are written to
+    sample_scenes = 3
+
+    bil_files = list_scenes(source_directory)[:sample_scenes]
+    benchmark(sample_squares(bil_files), output_directory)
@@ -0,0 +1,162 @@
+"""
+Overview pyramid for the global DEM composite (LandsatDEM_composite_image.tif), and bounding-box reads at a
+requested resolution from the best overview level, so previews and random-patch sampling at coarse scale do not
+read full-resolution data.
+
+    build_overviews(r"K:\\GDA\\GIS\\LandsatDEM_composite_image.tif", resampling='AVERAGE')
+    with CompositeReader(r"K:\\GDA\\GIS\\LandsatDEM_composite_image.tif") as composite:
+        data, geotransform = composite.read_bbox(-84.0, 39.0, -82.0, 41.0, resolution=0.01)
+"""
+import math
+import sys
+import time
+import numpy as np
+from osgeo import gdal
+
+OVERVIEW_FACTORS = [2, 4, 8, 16, 32, 64, 128, 256]
+RESAMPLING = 'AVERAGE'  # Elevations average well; use 'NEAREST' to keep original values, 'MODE' for classes
+RESAMPLING_METHODS = ['NEAREST', 'AVERAGE', 'BILINEAR', 'CUBIC', 'CUBICSPLINE', 'LANCZOS', 'MODE', 'GAUSS', 'RMS']
+OVERVIEW_COMPRESS = 'DEFLATE'
+NUM_THREADS = 'ALL_CPUS'  # GDAL_NUM_THREADS while computing and compressing overviews
+
+# Resampling used when a read is scaled from the chosen overview to the requested resolution
+READ_RESAMPLING = {
+    'NEAREST': gdal.GRIORA_NearestNeighbour,
+    'AVERAGE': gdal.GRIORA_Average,
+    'BILINEAR': gdal.GRIORA_Bilinear,
+    'CUBIC': gdal.GRIORA_Cubic,
+}
+
+def build_overviews(composite_path, factors=OVERVIEW_FACTORS, resampling=RESAMPLING, external=False,
+                    compress=OVERVIEW_COMPRESS, num_threads=NUM_THREADS):
+    """
+    Build overviews for the composite. Internal overviews are written into the GeoTIFF; external ones go to a
+    .ovr next to it, which leaves the composite itself untouched (and works while it is open read-only elsewhere).
+    """
+    resampling = resampling.upper()
+    if resampling not in RESAMPLING_METHODS:
+        raise ValueError(f"Unknown resampling {resampling!r}, expected one of {RESAMPLING_METHODS}")
+
+    config = {
+        'GDAL_NUM_THREADS': str(num_threads),
+        'COMPRESS_OVERVIEW': compress or 'NONE',
+        'BIGTIFF_OVERVIEW': 'IF_SAFER',
+        'GDAL_TIFF_OVR_BLOCKSIZE': '512',
+    }
+    if compress in ('DEFLATE', 'ZSTD', 'LZW'):
+        config['PREDICTOR_OVERVIEW'] = '2'
+    previous = {key: gdal.GetConfigOption(key) for key in config}
+    for key, value in config.items():
+        gdal.SetConfigOption(key, value)
+
+    try:
+        dataset = gdal.Open(composite_path, gdal.GA_ReadOnly if external else gdal.GA_Update)
+        if dataset is None:
+            raise RuntimeError(f"Failed to open {composite_path}")
+        band = dataset.GetRasterBand(1)
+        if band.DataType in (gdal.GDT_Float32, gdal.GDT_Float64) and 'PREDICTOR_OVERVIEW' in config:
+            gdal.SetConfigOption('PREDICTOR_OVERVIEW', '3')
+
+        # Factors whose overview would be smaller than one pixel are of no use
+        factors = [factor for factor in factors if dataset.RasterXSize // factor >= 1 and dataset.RasterYSize // factor >= 1]
+        print(f"Building {resampling} overviews {factors} for {composite_path} "
+              f"({dataset.RasterXSize} x {dataset.RasterYSize}, {'external .ovr' if external else 'internal'})")
+
+        start_time = time.time()
+
+        def progress(complete, message, data):
+            print(f"\rOverviews: {complete * 100:5.1f}% ({time.time() - start_time:.0f}s)", end='')
+            return 1
+
+        dataset.BuildOverviews(resampling, factors, callback=progress)
+        print()
+        dataset = None
+    finally:
+        for key, value in previous.items():
+            gdal.SetConfigOption(key, value)
+    print(f"Overviews built in {time.time() - start_time:.1f}s")
+
+class CompositeReader:
+    """
+    Reads bounding boxes of the composite at a requested resolution (in the composite's units, e.g. degrees).
+    """
+    def __init__(self, composite_path):
+        self.dataset = gdal.Open(composite_path)
+        if self.dataset is None:
+            raise RuntimeError(f"Failed to open {composite_path}")
+        self.geotransform = self.dataset.GetGeoTransform()
+        band = self.dataset.GetRasterBand(1)
+        self.nodata = band.GetNoDataValue()
+
+        # Level 0 is full resolution; later levels are the overviews, finest first
+        self.levels = [band] + [band.GetOverview(i) for i in range(band.GetOverviewCount())]
+        self.levels.sort(key=lambda level: -level.XSize)
+
+    def level_pixel_size(self, level):
+        return abs(self.geotransform[1]) * self.dataset.RasterXSize / level.XSize
+
+    def best_level(self, resolution):
+        """
+        The coarsest level whose pixels are no larger than the requested resolution.
+        """
+        chosen = 0
+        for idx, level in enumerate(self.levels):
+            if self.level_pixel_size(level) <= resolution * (1 + 1e-9):
+                chosen = idx
+        return chosen
+
+    def read_bbox(self, min_x, min_y, max_x, max_y, resolution=None, resampling=RESAMPLING):
+        """
+        Return (array, geotransform) covering the bounding box at about the requested resolution.
+        Without a resolution the full-resolution data is read. Parts of the box outside the composite are cut off.
+        """
+        level_idx = self.best_level(resolution) if resolution else 0
+        level = self.levels[level_idx]
+        scale_x = self.dataset.RasterXSize / level.XSize
+        scale_y = self.dataset.RasterYSize / level.YSize
+        pixel_x = self.geotransform[1] * scale_x
+        pixel_y = self.geotransform[5] * scale_y
+
+        x_off = max(int(math.floor((min_x - self.geotransform[0]) / pixel_x)), 0)
+        y_off = max(int(math.floor((max_y - self.geotransform[3]) / pixel_y)), 0)
+        x_end = min(int(math.ceil((max_x - self.geotransform[0]) / pixel_x)), level.XSize)
+        y_end = min(int(math.ceil((min_y - self.geotransform[3]) / pixel_y)), level.YSize)
+        if x_end <= x_off or y_end <= y_off:
+            raise ValueError(f"Bounding box {(min_x, min_y, max_x, max_y)} does not overlap the composite")
+        width, height = x_end - x_off, y_end - y_off
+
+        # Scale the overview window to exactly the requested resolution
+        buf_x, buf_y = width, height
+        if resolution:
+            buf_x = max(int(round(width * abs(pixel_x) / resolution)), 1)
+            buf_y = max(int(round(height * abs(pixel_y) / resolution)), 1)
+        data = level.ReadAsArray(x_off, y_off, width, height, buf_xsize=buf_x, buf_ysize=buf_y,
+                                 resample_alg=READ_RESAMPLING.get(resampling.upper(), gdal.GRIORA_NearestNeighbour))
+
+        geotransform = (self.geotransform[0] + x_off * pixel_x, pixel_x * width / buf_x, 0,
+                        self.geotransform[3] + y_off * pixel_y, 0, pixel_y * height / buf_y)
+        return data, geotransform
+
+    def read_masked(self, min_x, min_y, max_x, max_y, resolution=None, resampling=RESAMPLING):
+        """
+        As read_bbox, with NoData masked out.
+        """
+        data, geotransform = self.read_bbox(min_x, min_y, max_x, max_y, resolution, resampling)
+        if self.nodata is None:
+            return np.ma.masked_invalid(data), geotransform
+        return np.ma.masked_values(data, self.nodata), geotransform
+
+    def close(self):
+        self.levels = []
+        self.dataset = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+if __name__ == "__main__":
+    composite_path = r"K:\GDA\GIS\LandsatDEM_composite_image.tif"  # The composite written by MERGE DEM.py
+    resampling = sys.argv[1] if len(sys.argv) > 1 else RESAMPLING
+    build_overviews(composite_path, resampling=resampling)
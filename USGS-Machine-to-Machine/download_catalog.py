@@ -0,0 +1,155 @@
+"""
+Indexed download catalog, replacing the pickled requestResults blob.
+
+Every planned download is a row keyed by downloadId with its entityId, url, expiry, label, status, bytes and
+sha256. The downloader, ValidateZip.py and ExtractZips.py update the status as a file moves through
+pending -> downloaded -> extracted (or failed / invalid), so their state no longer has to be re-derived from the
+filesystem, and lookups by id or status use the indexes instead of rebuilding a dict on every run. Downloads M2M is
+still preparing have no url yet; they stay 'preparing', and are not handed to the downloader, until a later
+download-retrieve result supplies one.
+
+    python download_catalog.py import requestResults   # one-off migration of the pickle
+    python download_catalog.py id 640811010 640811011
+    python download_catalog.py status failed
+    python download_catalog.py summary
+"""
+import argparse
+import os
+import pickle
+import sqlite3
+import time
+
+CATALOG_FILE = 'download_catalog.sqlite'
+BUSY_TIMEOUT = 300
+STATUSES = ['preparing', 'pending', 'downloaded', 'failed', 'invalid', 'extracted']
+
+COLUMNS = ['download_id', 'entity_id', 'url', 'expiry', 'label', 'status', 'bytes', 'sha256', 'updated']
+
+class DownloadCatalog:
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS downloads ('
+                                    'download_id INTEGER PRIMARY KEY, entity_id TEXT, url TEXT, expiry TEXT, '
+                                    "label TEXT, status TEXT NOT NULL DEFAULT 'pending', bytes INTEGER, sha256 TEXT, "
+                                    'updated REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS downloads_status ON downloads (status)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS downloads_entity ON downloads (entity_id)')
+
+    def import_request_results(self, requestResults):
+        """
+        Add the downloads of a download-request (or download-retrieve) response. URLs and expiry of known downloads
+        are refreshed, since M2M hands out new links; their status is kept, except that a 'preparing' download
+        becomes 'pending' once its url arrives.
+        """
+        labels = requestResults.get('duplicateProducts') or {}
+        labels = labels if isinstance(labels, dict) else {}
+        rows = []
+        for key in ('availableDownloads', 'preparingDownloads', 'available', 'requested'):
+            for download in requestResults.get(key) or []:
+                url = download.get('url')
+                rows.append((int(download['downloadId']), download.get('entityId'), url,
+                             download.get('expirationDate') or download.get('expiration'),
+                             download.get('label') or labels.get(str(download['downloadId'])),
+                             'pending' if url else 'preparing', time.time()))
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO downloads (download_id, entity_id, url, expiry, label, status, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(download_id) DO UPDATE SET '
+                "status = CASE WHEN status = 'preparing' AND excluded.url IS NOT NULL THEN 'pending' ELSE status END, "
+                'entity_id = COALESCE(excluded.entity_id, entity_id), url = COALESCE(excluded.url, url), '
+                'expiry = COALESCE(excluded.expiry, expiry), label = COALESCE(excluded.label, label), '
+                'updated = excluded.updated', rows)
+        return len(rows)
+
+    def import_pickle(self, path='requestResults'):
+        with open(path, 'rb') as inFyle:
+            return self.import_request_results(pickle.load(inFyle))
+
+    def get(self, download_id):
+        return self.connection.execute('SELECT * FROM downloads WHERE download_id = ?', (int(download_id),)).fetchone()
+
+    def url(self, download_id):
+        row = self.get(download_id)
+        return row['url'] if row is not None else None
+
+    def by_status(self, *statuses):
+        placeholders = ', '.join('?' for _ in statuses)
+        return self.connection.execute(f'SELECT * FROM downloads WHERE status IN ({placeholders}) ORDER BY download_id',
+                                       statuses).fetchall()
+
+    def downloads(self, *statuses):
+        """
+        Rows as the {'downloadId', 'url'} dicts the downloader takes, optionally only with the given statuses.
+        Downloads without a url yet are left out.
+        """
+        rows = self.by_status(*statuses) if statuses else self.connection.execute(
+            'SELECT * FROM downloads ORDER BY download_id').fetchall()
+        return [{'downloadId': row['download_id'], 'url': row['url']} for row in rows if row['url']]
+
+    def set_status(self, download_id, status, size=None, sha256=None):
+        """
+        Update a download's status; size and hash are only overwritten when given.
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status {status!r}, expected one of {STATUSES}")
+        with self.connection:
+            self.connection.execute('UPDATE downloads SET status = ?, bytes = COALESCE(?, bytes), '
+                                    'sha256 = COALESCE(?, sha256), updated = ? WHERE download_id = ?',
+                                    (status, size, sha256, time.time(), int(download_id)))
+
+    def set_status_many(self, download_ids, status):
+        """
+        Set the status of many downloads in one transaction.
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status {status!r}, expected one of {STATUSES}")
+        now = time.time()
+        with self.connection:
+            self.connection.executemany('UPDATE downloads SET status = ?, updated = ? WHERE download_id = ?',
+                                        [(status, now, int(download_id)) for download_id in download_ids])
+
+    def summary(self):
+        return dict(self.connection.execute('SELECT status, COUNT(*) FROM downloads GROUP BY status').fetchall())
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM downloads').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+def download_id_of(file_path):
+    """
+    The downloadId of a <downloadId>.zip file, or None for other names.
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return int(stem) if stem.isdigit() else None
+
+def print_rows(rows):
+    for row in rows:
+        print('  '.join(f"{column}={row[column]}" for column in COLUMNS if row[column] is not None))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or fill the M2M download catalog")
+    parser.add_argument('--catalog', default=CATALOG_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('import', help="Import a pickled requestResults file").add_argument('path', nargs='?', default='requestResults')
+    commands.add_parser('id', help="Look up downloads by id").add_argument('ids', nargs='+', type=int)
+    commands.add_parser('status', help="List downloads with a status").add_argument('status', choices=STATUSES)
+    commands.add_parser('summary', help="Count downloads per status")
+    args = parser.parse_args()
+
+    catalog = DownloadCatalog(args.catalog)
+    if args.command == 'import':
+        print(f"Imported {catalog.import_pickle(args.path)} downloads from {args.path}")
+    elif args.command == 'id':
+        for download_id in args.ids:
+            row = catalog.get(download_id)
+            print_rows([row]) if row is not None else print(f"{download_id}: not in catalog")
+    elif args.command == 'status':
+        print_rows(catalog.by_status(args.status))
+    print(f"{len(catalog)} downloads: {catalog.summary()}")
+    catalog.close()
@@ -0,0 +1,202 @@
+"""
+Reusable client for the USGS M2M JSON API.
+
+One pooled requests.Session is shared by every call, and errors raise M2MError instead of exiting the script.
+On top of send() it provides:
+    scene_search       - every page of a scene-search, fetched in parallel once the first page gives the total
+    download_options   - entity ids sent in batches, in parallel
+    download_request   - downloads submitted in batches, responses merged into one result
+    poll_download_retrieve - download-retrieve with exponential backoff instead of a fixed 30 s sleep
+Responses of the read-only search endpoints are cached on disk under CACHE_DIRECTORY, keyed by a hash of the
+endpoint and payload, so re-planning a download does not repeat thousands of round-trips. Cached responses older
+than CACHE_TTL are fetched again. download-options is not cached, since availability and URLs change over time.
+
+    client = M2MClient()
+    client.login(username, password)
+    scenes = client.scene_search('gls2000_dem')
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from m2m_downloader import make_session
+
+SERVICE_URL = "https://m2m.cr.usgs.gov/api/api/json/stable/"
+CACHE_DIRECTORY = 'm2m_cache'
+CACHED_ENDPOINTS = {'dataset-search', 'scene-search', 'dataset-filters'}
+CACHE_TTL = 7 * 24 * 3600  # Seconds a cached response is reused; new acquisitions show up in searches after this
+REQUEST_WORKERS = 4  # Concurrent API calls; the M2M API throttles aggressive clients
+PAGE_SIZE = 10000  # scene-search results per page
+OPTIONS_BATCH = 5000  # Entity ids per download-options call
+REQUEST_BATCH = 5000  # Downloads per download-request call
+TIMEOUT = (30, 600)
+POLL_TIMEOUT = 6 * 3600  # Seconds poll_download_retrieve waits for prepared downloads before giving up
+SUMMED_FIELDS = {'numInvalidScenes'}  # download-request counts that add up across batches
+
+class M2MError(Exception):
+    def __init__(self, endpoint, error_code, error_message, request_id=None):
+        super().__init__(f"{endpoint}: {error_code} - {error_message} (request {request_id})")
+        self.endpoint = endpoint
+        self.error_code = error_code
+        self.error_message = error_message
+        self.request_id = request_id
+
+def payload_key(endpoint, payload):
+    return hashlib.sha256(json.dumps([endpoint, payload], sort_keys=True).encode('utf-8')).hexdigest()
+
+def merge_results(total, part):
+    """
+    Merge one batch's download-request response into the running total: lists are concatenated, dicts updated and
+    counts summed. The API sends an empty newRecords/duplicateProducts as [] but a filled one as a dict, so an empty
+    list or dict adds nothing and never replaces what earlier batches returned.
+    """
+    for key, value in (part or {}).items():
+        existing = total.get(key)
+        if isinstance(value, (list, dict)) and not value:
+            total.setdefault(key, value)
+        elif isinstance(value, list):
+            total[key] = (existing if isinstance(existing, list) else []) + value
+        elif isinstance(value, dict):
+            total[key] = {**(existing if isinstance(existing, dict) else {}), **value}
+        elif key in SUMMED_FIELDS and isinstance(value, int):
+            total[key] = (existing if isinstance(existing, int) else 0) + value
+        else:
+            total.setdefault(key, value)
+    return total
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class M2MClient:
+    def __init__(self, service_url=SERVICE_URL, api_key=None, cache_directory=CACHE_DIRECTORY, workers=REQUEST_WORKERS):
+        self.service_url = service_url
+        self.session = make_session(workers)
+        self.workers = workers
+        self.cache_directory = cache_directory
+        self.cache_lock = threading.Lock()
+        if api_key is not None:
+            self.session.headers['X-Auth-Token'] = api_key
+
+    def send(self, endpoint, payload=None, use_cache=None):
+        """
+        POST payload to an endpoint and return the response's data, raising M2MError if the API reports an error.
+        """
+        use_cache = endpoint in CACHED_ENDPOINTS if use_cache is None else use_cache
+        cache_path = None
+        if use_cache and self.cache_directory:
+            cache_path = os.path.join(self.cache_directory, payload_key(endpoint, payload) + '.json')
+            if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < CACHE_TTL:
+                with open(cache_path, 'r') as f:
+                    return json.load(f)
+
+        response = self.session.post(self.service_url + endpoint, json.dumps(payload), timeout=TIMEOUT)
+        try:
+            output = response.json()
+        except ValueError:
+            raise M2MError(endpoint, response.status_code, f"Unparseable response: {response.text[:200]}")
+        finally:
+            response.close()
+        if output.get('errorCode') is not None:
+            raise M2MError(endpoint, output['errorCode'], output.get('errorMessage'), output.get('requestId'))
+        if response.status_code >= 400:
+            raise M2MError(endpoint, response.status_code, response.reason, output.get('requestId'))
+        print(f"Finished request {endpoint} with request ID {output.get('requestId')}")
+
+        if cache_path is not None:
+            with self.cache_lock:
+                os.makedirs(self.cache_directory, exist_ok=True)
+                temp_path = cache_path + '.tmp'
+                with open(temp_path, 'w') as f:
+                    json.dump(output['data'], f)
+                os.replace(temp_path, cache_path)
+        return output['data']
+
+    def login(self, username, password):
+        api_key = self.send('login', {'username': username, 'password': password}, use_cache=False)
+        self.session.headers['X-Auth-Token'] = api_key
+        return api_key
+
+    def login_token(self, username, token):
+        api_key = self.send('login-token', {'username': username, 'token': token}, use_cache=False)
+        self.session.headers['X-Auth-Token'] = api_key
+        return api_key
+
+    def logout(self):
+        self.send('logout', None, use_cache=False)
+        self.session.headers.pop('X-Auth-Token', None)
+        self.session.close()
+
+    def scene_search(self, dataset_name, scene_filter=None, page_size=PAGE_SIZE, max_results=None, use_cache=None):
+        """
+        Return every scene-search result. The first page gives totalHits; the remaining pages are fetched in parallel.
+        """
+        def page(starting_number):
+            payload = {'datasetName': dataset_name, 'maxResults': page_size, 'startingNumber': starting_number}
+            if scene_filter is not None:
+                payload['sceneFilter'] = scene_filter
+            return self.send('scene-search', payload, use_cache)
+
+        first = page(1)
+        results = list(first['results'])
+        total = first['totalHits'] if max_results is None else min(first['totalHits'], max_results)
+        starts = list(range(1 + page_size, total + 1, page_size))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for data in executor.map(page, starts):
+                results.extend(data['results'])
+        print(f"scene-search {dataset_name}: {len(results[:total])} of {first['totalHits']} scenes in {1 + len(starts)} pages")
+        return results[:total]
+
+    def download_options(self, dataset_name, entity_ids, batch_size=OPTIONS_BATCH, use_cache=None):
+        """
+        download-options for any number of entity ids, in parallel batches.
+        """
+        def batch(ids):
+            return self.send('download-options', {'datasetName': dataset_name, 'entityIds': ids}, use_cache)
+
+        options = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for data in executor.map(batch, list(batches(list(entity_ids), batch_size))):
+                options.extend(data or [])
+        return options
+
+    def download_request(self, downloads, label, batch_size=REQUEST_BATCH):
+        """
+        Submit downloads in batches under one label and return the merged response.
+        """
+        merged = {}
+        for idx, batch in enumerate(batches(list(downloads), batch_size), start=1):
+            print(f"download-request batch {idx}: {len(batch)} downloads")
+            merge_results(merged, self.send('download-request', {'downloads': batch, 'label': label}, use_cache=False))
+        return merged
+
+    def poll_download_retrieve(self, label, wanted, expected_count, initial_delay=5, max_delay=300,
+                               timeout=POLL_TIMEOUT):
+        """
+        Yield each available download from download-retrieve whose downloadId is in `wanted` (as strings), until
+        expected_count have been yielded. Waits grow exponentially while nothing new is ready and reset when
+        something is. Gives up after `timeout` seconds (None waits indefinitely).
+        """
+        seen = set()
+        delay = initial_delay
+        start_time = time.time()
+        while True:
+            data = self.send('download-retrieve', {'label': label}, use_cache=False)
+            new = 0
+            for download in (data.get('available') or []) + (data.get('requested') or []):
+                download_id = str(download['downloadId'])
+                if download_id in seen or download_id not in wanted or not download.get('url'):
+                    continue
+                seen.add(download_id)
+                new += 1
+                yield download
+            if len(seen) >= expected_count:
+                return
+            if timeout is not None and time.time() - start_time > timeout:
+                print(f"Gave up on {expected_count - len(seen)} downloads after {timeout}s")
+                return
+            delay = initial_delay if new else min(delay * 2, max_delay)
+            print(f"{expected_count - len(seen)} downloads are not available. Waiting for {delay} seconds.")
+            time.sleep(delay)
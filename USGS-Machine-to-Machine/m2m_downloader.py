@@ -0,0 +1,232 @@
+"""
+Concurrent, resumable downloader for M2M download URLs.
+
+Transfers run on a thread pool sharing one pooled requests.Session, under a global token-bucket limit on how
+often a transfer may start. Each file is written to <name>.part and renamed into place only once it is complete,
+so an interrupted or failed transfer never leaves a truncated .zip that looks finished; the next run resumes
+the .part with an HTTP Range request.
+
+Files are verified while they stream: the bytes received must match the server's Content-Length (the total from
+Content-Range when resuming) and a SHA-256 is computed as they are written. Size and hash go to MANIFEST_FILE in
+the download directory, so ValidateZip.py only needs to deep-check files the downloader did not verify.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import gmtime, strftime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DOWNLOAD_WORKERS = 8  # Concurrent transfers
+RATE_CALLS = 200  # Transfers started per RATE_PERIOD seconds, as the old ratelimit decorator allowed
+RATE_PERIOD = 300
+CHUNK_SIZE = 1024 * 1024  # Bytes read from the socket per iteration; a broken connection loses at most one chunk
+WRITE_BUFFER = 8 * 1024 * 1024  # File buffer, so the disk sees a few large writes
+TIMEOUT = (30, 300)  # Connect and read timeouts in seconds
+RETRIES = 5  # Attempts per file, each resuming from what is already in the .part file
+MANIFEST_FILE = 'download_manifest.jsonl'  # One JSON line per verified file, in the download directory
+
+class IncompleteDownload(IOError):
+    pass
+
+def log(message):
+    print(strftime("%Y-%m-%d %H:%M:%S", gmtime()) + ' - ' + message)
+
+class TokenBucket:
+    """
+    Allows `calls` acquisitions per `period` seconds across all threads, with bursts of up to `calls`.
+    """
+    def __init__(self, calls=RATE_CALLS, period=RATE_PERIOD):
+        self.capacity = calls
+        self.tokens = float(calls)
+        self.fill_rate = calls / period
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+class DownloadManifest:
+    """
+    Append-only record of verified files: {'file', 'size', 'sha256', 'verified'} per line, the last line per file wins.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by a crash
+                    self.entries[entry['file']] = entry
+
+    def get(self, file_name):
+        return self.entries.get(file_name)
+
+    def is_verified(self, file_path):
+        """
+        True when the file has a manifest entry and is still the size that was verified.
+        """
+        entry = self.entries.get(os.path.basename(file_path))
+        return entry is not None and os.path.exists(file_path) and os.path.getsize(file_path) == entry['size']
+
+    def record(self, file_name, size, sha256=None, verified='download'):
+        entry = {'file': file_name, 'size': size, 'sha256': sha256, 'verified': verified}
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.entries[file_name] = entry
+
+    def remove(self, file_name):
+        with self.lock:
+            if self.entries.pop(file_name, None) is not None:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps({'file': file_name, 'size': -1, 'sha256': None, 'verified': 'removed'}) + '\n')
+
+def expected_size(response, offset):
+    """
+    Total size of the file from the response headers, or None if the server does not say.
+    """
+    content_range = response.headers.get('Content-Range')
+    if response.status_code == 206 and content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get('Content-Length')
+    if content_length is None or response.headers.get('Content-Encoding'):
+        return None
+    return int(content_length) + (offset if response.status_code == 206 else 0)
+
+def hash_file(path, hasher, chunk_size=CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher
+
+def make_session(pool_size=DOWNLOAD_WORKERS):
+    """
+    A Session whose connection pool is large enough for every worker, retrying connection errors and 5xx/429.
+    """
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def download_file(session, url, download_to, bucket=None, chunk_size=CHUNK_SIZE, retries=RETRIES):
+    """
+    Download url to download_to through download_to + '.part', resuming a partial file with a Range request.
+    The size is checked against the server's and the file hashed as it is written.
+    Returns {'size', 'sha256'} of the finished file.
+    """
+    part_path = download_to + '.part'
+    for attempt in range(1, retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        try:
+            with session.get(url, stream=True, headers=headers, timeout=TIMEOUT) as response:
+                if response.status_code == 416:
+                    # Nothing left to send: the .part is already complete (or longer than the file), so start over
+                    # rather than trust bytes that were never checked against a size
+                    os.remove(part_path)
+                    raise IncompleteDownload(f"Server rejected resume at byte {offset}")
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    offset = 0  # Server ignored the Range header, start over
+                expected = expected_size(response, offset)
+
+                # Hash what an earlier attempt already wrote, then every new chunk as it is written
+                hasher = hash_file(part_path, hashlib.sha256()) if offset else hashlib.sha256()
+                written = offset
+                with open(part_path, 'ab' if offset else 'wb', buffering=WRITE_BUFFER) as outFyle:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            outFyle.write(chunk)
+                            hasher.update(chunk)
+                            written += len(chunk)
+
+            if expected is not None and written != expected:
+                if written > expected:
+                    os.remove(part_path)
+                raise IncompleteDownload(f"Received {written} of {expected} bytes")
+            break
+        except (requests.RequestException, OSError) as e:
+            if attempt == retries:
+                raise
+            log(f"Retrying {os.path.basename(download_to)} (attempt {attempt}/{retries}): {e}")
+            time.sleep(min(2 ** attempt, 60))
+
+    os.replace(part_path, download_to)
+    return {'size': written, 'sha256': hasher.hexdigest()}
+
+def download_all(downloads, download_directory, workers=DOWNLOAD_WORKERS, bucket=None, catalog=None):
+    """
+    Download every entry of requestResults['availableDownloads'] (or DownloadCatalog.downloads()) to <downloadId>.zip
+    and return (successes, failures). With a catalog, each download's status, size and hash are recorded there too.
+    """
+    os.makedirs(download_directory, exist_ok=True)
+    bucket = bucket or TokenBucket()
+    session = make_session(workers)
+    manifest = DownloadManifest(os.path.join(download_directory, MANIFEST_FILE))
+
+    todo = []
+    for download in downloads:
+        download_to = os.path.join(download_directory, str(download['downloadId']) + '.zip')
+        if os.path.exists(download_to):
+            # Don't re-download if we already have; finished files only appear through the atomic rename
+            log("ALREADY EXISTS: " + str(download['downloadId']))
+            entry = manifest.get(str(download['downloadId']) + '.zip')
+            if catalog is not None and entry is not None:
+                catalog.set_status(download['downloadId'], 'downloaded', entry['size'], entry['sha256'])
+        else:
+            todo.append((download, download_to))
+    log(f"{len(downloads) - len(todo)}/{len(downloads)} already downloaded, {len(todo)} to go on {workers} workers")
+
+    successes = 0
+    failures = []
+    downloaded_bytes = 0
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        future_to_download = {executor.submit(download_file, session, download['url'], download_to, bucket): download
+                              for download, download_to in todo}
+        for future in as_completed(future_to_download):
+            download = future_to_download[future]
+            try:
+                result = future.result()
+                manifest.record(str(download['downloadId']) + '.zip', result['size'], result['sha256'])
+                if catalog is not None:
+                    catalog.set_status(download['downloadId'], 'downloaded', result['size'], result['sha256'])
+                downloaded_bytes += result['size']
+                successes += 1
+                elapsed = time.time() - start_time
+                log(f"Complete {download['downloadId']} ({successes + len(failures)}/{len(todo)}, "
+                    f"{downloaded_bytes / (1024 * 1024) / elapsed:.1f} MiB/s overall)")
+            except Exception:
+                # Capture a list of failures
+                failures.append(download)
+                if catalog is not None:
+                    catalog.set_status(download['downloadId'], 'failed')
+                log("!!! ERROR !!! - Failed to download " + str(download['downloadId']))
+                print(sys.exc_info()[0])
+                print(sys.exc_info()[1])
+    session.close()
+    return successes, failures
@@ -0,0 +1,191 @@
+"""
+Single-read, multi-product tiler: cuts every product in TILE_SPECS (e.g. the 1 km GeoTIFF squares and the 0.1 degree
+PNG tiles) from one pass over each .bil scene, instead of DEM-1km-1km.py and Landsat-Bil2PNG-TenthDegSq.py
+each reading all ~20,000 scenes again.
+
+A tile spec is a dict:
+    name          - short product name, used in the ledger and in progress messages
+    size_km       - tile size in km (converted with 1 degree = 111 km, as in DEM-1km-1km.py), or
+    size_deg      - tile size in degrees
+    format        - 'GTiff' (Float32 with the source NoData) or 'PNG' (16-bit grayscale + .pgw world file)
+    destination   - output folder
+    fill_value    - written where the source is NoData (default NaN for GTiff, 0 for PNG)
+    naming        - file name pattern without extension, formatted with center_lat, center_lon, min_lon, max_lat
+    partial_edges - also write the narrower tiles at the right/bottom edge of the scene (default True for GTiff)
+    png_options   - passed to png_encoder for PNG products
+    gtiff_options - GeoTIFF output mode for GTiff products (compression, tiling, overviews, COG, Int16 scaling);
+                    see tile_writers.DEFAULT_GTIFF_OPTIONS
+    archive       - pack the tiles into a tile_archive store in destination instead of one file per tile
+                    (the PNG geotransform goes in the archive index instead of a .pgw)
+"""
+import os
+import time
+from concurrent.futures import as_completed
+from functools import partial
+import numpy as np
+from osgeo import gdal
+from raster_strips import iter_multi_strips, fill_nodata, track_peak_memory
+from tile_ledger import TileLedger
+from scene_catalog import list_scenes
+from tile_pipeline import BoundedProcessPool
+from tile_archive import TileArchiveWriter
+from tile_writers import write_geotiff, write_png_tile, encode_geotiff, encode_png_tile
+
+LEDGER_FILE = 'tile_ledger_multi.sqlite'
+WRITE_WORKERS = os.cpu_count() or 1  # Writer/encoder processes shared by all products
+QUEUE_DEPTH = 256  # Tiles in flight before the reader waits for the writers
+
+DEFAULT_NAMING = '{center_lat:.6f}_{center_lon:.6f}'
+
+FORMAT_DEFAULTS = {
+    'GTiff': {'extension': '.tif', 'fill_value': np.nan, 'dtype': np.float32, 'partial_edges': True},
+    'PNG': {'extension': '.png', 'fill_value': 0, 'dtype': np.uint16, 'partial_edges': False},
+}
+
+TILE_SPECS = [
+    {'name': '1km', 'size_km': 1, 'format': 'GTiff', 'destination': r"J:\GDA\GIS\LandsatDEM-1kmsq"},
+    {'name': '0.1deg', 'size_deg': 0.1, 'format': 'PNG', 'destination': r"C:\Landsat-OneTenthDegSqs"},
+]
+
+def resolve_spec(spec):
+    """
+    Fill in the format defaults and validate a tile spec.
+    """
+    if spec.get('format') not in FORMAT_DEFAULTS:
+        raise ValueError(f"Tile spec {spec.get('name')!r} has unknown format {spec.get('format')!r}, expected one of {sorted(FORMAT_DEFAULTS)}")
+    if ('size_km' in spec) == ('size_deg' in spec):
+        raise ValueError(f"Tile spec {spec.get('name')!r} needs exactly one of size_km or size_deg")
+
+    resolved = {**FORMAT_DEFAULTS[spec['format']], 'naming': DEFAULT_NAMING, 'png_options': None, 'gtiff_options': None,
+                'archive': False, **spec}
+    resolved['size_deg'] = spec['size_km'] / 111 if 'size_km' in spec else spec['size_deg']
+    return resolved
+
+def tile_scenes(source_directory, tile_specs=TILE_SPECS, write_workers=WRITE_WORKERS, queue_depth=QUEUE_DEPTH):
+    specs = [resolve_spec(spec) for spec in tile_specs]
+    for spec in specs:
+        os.makedirs(spec['destination'], exist_ok=True)
+
+    # Extracted .bil files or .bil members of the downloaded zips, read through /vsizip/
+    all_files = list_scenes(source_directory)
+    total_files = len(all_files)
+
+    ledger = TileLedger(LEDGER_FILE)
+    ledger.register_scenes(all_files)
+    done_scenes = ledger.completed_scenes()
+    archives = {spec['name']: TileArchiveWriter(spec['destination']) for spec in specs if spec['archive']}
+
+    with BoundedProcessPool(write_workers, queue_depth) as pool:
+        for idx, file_path in enumerate(all_files):
+            if file_path in done_scenes:
+                continue
+            print(f"Processing file {idx + 1}/{total_files}: {file_path}")
+            start_time = time.time()
+            tile_scene(file_path, specs, ledger, pool, archives)
+            print(f"Finished processing {file_path} in {time.time() - start_time:.1f}s")
+    for archive in archives.values():
+        archive.close()
+    ledger.close()
+
+def tile_scene(file_path, specs, ledger, pool, archives=None):
+    archives = archives or {}
+    dataset = gdal.Open(file_path)
+    if dataset is None:
+        print(f"Failed to open {file_path}")
+        return
+
+    geotransform = dataset.GetGeoTransform()
+    projection = dataset.GetProjection()
+    band = dataset.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    cols = dataset.RasterXSize
+    rows = dataset.RasterYSize
+    pixel_width = geotransform[1]
+    pixel_height = geotransform[5]
+
+    grids = []
+    for spec in specs:
+        pixels_x = int(spec['size_deg'] / pixel_width)
+        pixels_y = int(abs(spec['size_deg'] / pixel_height))
+        if spec['partial_edges']:
+            tiles_x, tiles_y = len(range(0, cols, pixels_x)), len(range(0, rows, pixels_y))
+        else:
+            tiles_x, tiles_y = cols // pixels_x, rows // pixels_y
+        grids.append({'pixels_x': pixels_x, 'pixels_y': pixels_y, 'tiles_x': tiles_x, 'tiles_y': tiles_y})
+
+    ledger.start_scene(file_path, sum(grid['tiles_x'] * grid['tiles_y'] for grid in grids))
+    completed = ledger.completed_tiles(file_path)
+    counts = {spec['name']: {'written': 0, 'skipped': 0} for spec in specs}
+
+    futures = []
+    with track_peak_memory(file_path):
+        for spec_idx, j, strip in iter_multi_strips(band, [grid['pixels_y'] for grid in grids]):
+            spec = specs[spec_idx]
+            grid = grids[spec_idx]
+            if j // grid['pixels_y'] >= grid['tiles_y']:
+                continue  # Partial bottom strip of a product that only writes full tiles
+
+            # The strip is shared with the other products, so fill NoData on a private copy
+            private = strip if np.dtype(spec['dtype']) != strip.dtype else strip.copy()
+            private = fill_nodata(private, nodata, spec['fill_value'], spec['dtype'])
+
+            for tile_x in range(grid['tiles_x']):
+                i = tile_x * grid['pixels_x']
+                min_lon = geotransform[0] + i * pixel_width
+                max_lat = geotransform[3] + j * pixel_height
+                center_lon = min_lon + (grid['pixels_x'] * pixel_width) / 2
+                center_lat = max_lat + (grid['pixels_y'] * pixel_height) / 2
+
+                stem = spec['naming'].format(center_lat=center_lat, center_lon=center_lon, min_lon=min_lon, max_lat=max_lat)
+                tile_id = f"{spec['name']}/{stem}"
+                subset = private[:, i:i + grid['pixels_x']]
+                geotransform_subset = (min_lon, pixel_width, 0, max_lat, 0, pixel_height)
+
+                archive = archives.get(spec['name'])
+                if archive is not None:
+                    # Archived tiles are recorded in the archive index, which is committed with the shard data
+                    if archive.contains(stem):
+                        counts[spec['name']]['skipped'] += 1
+                        continue
+                    on_result = partial(archive.add, stem, file_format=spec['format'], center_lat=center_lat,
+                                        center_lon=center_lon, geotransform=geotransform_subset)
+                    if spec['format'] == 'GTiff':
+                        futures.append(pool.submit(encode_geotiff, subset, projection, geotransform_subset, nodata,
+                                                   spec['gtiff_options'], on_result=on_result, task_id=tile_id))
+                    else:
+                        futures.append(pool.submit(encode_png_tile, subset, spec['png_options'], on_result=on_result,
+                                                   task_id=tile_id))
+                    counts[spec['name']]['written'] += 1
+                    continue
+
+                if tile_id in completed:
+                    continue
+
+                output_path = os.path.join(spec['destination'], stem + spec['extension'])
+                pgw_path = os.path.splitext(output_path)[0] + '.pgw'
+                if os.path.exists(output_path) and (spec['format'] != 'PNG' or os.path.exists(pgw_path)):
+                    counts[spec['name']]['skipped'] += 1
+                    ledger.mark_tile(file_path, tile_id)
+                    continue
+
+                on_success = partial(ledger.mark_tile, file_path, tile_id)
+                if spec['format'] == 'GTiff':
+                    futures.append(pool.submit(write_geotiff, subset, output_path, projection, geotransform_subset, nodata,
+                                               spec['gtiff_options'], on_success=on_success, task_id=tile_id))
+                else:
+                    futures.append(pool.submit(write_png_tile, subset, output_path, pgw_path, geotransform_subset,
+                                               spec['png_options'], on_success=on_success, task_id=tile_id))
+                counts[spec['name']]['written'] += 1
+
+        for future in as_completed(futures):
+            future.result()
+
+    for archive in archives.values():
+        archive.flush()
+    ledger.mark_scene_done(file_path)
+    for name, count in counts.items():
+        print(f"{name}: wrote {count['written']} tiles, skipped {count['skipped']} existing from {file_path}")
+
+if __name__ == "__main__":
+    source_directory = r"J:\GDA\GIS\LandsatEXTRACT"  # Change this to your source folder containing .bil files
+    tile_scenes(source_directory)  # Change the destinations in TILE_SPECS
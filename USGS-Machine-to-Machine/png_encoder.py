@@ -0,0 +1,129 @@
+"""
+PNG writer for grayscale DEM tiles with a tunable zlib level, zlib strategy and row filter.
+
+Two backends produce the same standard grayscale PNG (16-bit for uint16 input):
+- 'pillow': Image.save, which picks a row filter per row itself; only the zlib level and strategy can be tuned.
+- 'numpy': filters every row with NumPy (a fixed filter, or 'adaptive' to pick the best per row) and deflates
+  with zlib directly. A fixed 'up' or 'paeth' filter with a low level is usually much faster on smooth elevation.
+  It also writes (height, width, 3) arrays as RGB PNGs, including 16-bit RGB, which Pillow cannot.
+
+The defaults reproduce the plain img.save(..., format='PNG') output.
+"""
+import io
+import struct
+import zlib
+import numpy as np
+from PIL import Image
+
+DEFAULT_PNG_OPTIONS = {
+    'backend': 'pillow',
+    'compress_level': 6,
+    'strategy': 'default',
+    'filter': 'adaptive',
+}
+
+STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+FILTERS = {'none': 0, 'sub': 1, 'up': 2, 'average': 3, 'paeth': 4}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def encode_png(array, options=None):
+    """
+    Encode a 2-D uint8 or uint16 array as grayscale PNG bytes (or, with the numpy backend, a 3-D one as RGB).
+    """
+    options = {**DEFAULT_PNG_OPTIONS, **(options or {})}
+    if options['strategy'] not in STRATEGIES:
+        raise ValueError(f"Unknown zlib strategy {options['strategy']!r}, expected one of {sorted(STRATEGIES)}")
+
+    if options['backend'] == 'pillow':
+        return _encode_pillow(array, options)
+    if options['backend'] == 'numpy':
+        return _encode_numpy(array, options)
+    raise ValueError(f"Unknown PNG backend {options['backend']!r}, expected 'pillow' or 'numpy'")
+
+def write_png(path, array, options=None):
+    data = encode_png(array, options)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _encode_pillow(array, options):
+    if options['filter'] != 'adaptive':
+        raise ValueError("The pillow backend always chooses row filters itself; use the numpy backend for a fixed filter")
+    buffer = io.BytesIO()
+    img = Image.fromarray(array)
+    img.save(buffer, format='PNG', compress_level=options['compress_level'],
+             compress_type=STRATEGIES[options['strategy']])
+    return buffer.getvalue()
+
+def _encode_numpy(array, options):
+    rgb = array.ndim == 3 and array.shape[2] == 3
+    if not (array.ndim == 2 or rgb) or array.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"Expected a 2-D or RGB uint8 or uint16 array, got {array.shape} {array.dtype}")
+    height, width = array.shape[:2]
+    bit_depth = array.dtype.itemsize * 8
+    bytes_per_pixel = array.dtype.itemsize * (3 if rgb else 1)
+
+    # PNG stores samples big-endian; view each row as its raw bytes
+    raw = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('>')).view(np.uint8).reshape(height, width * bytes_per_pixel)
+    rows = _filter_rows(raw, options['filter'], bytes_per_pixel)
+
+    compressor = zlib.compressobj(options['compress_level'], zlib.DEFLATED, zlib.MAX_WBITS, 9,
+                                  STRATEGIES[options['strategy']])
+    idat = compressor.compress(rows.tobytes()) + compressor.flush()
+
+    ihdr = struct.pack('>IIBBBBB', width, height, bit_depth, 2 if rgb else 0, 0, 0, 0)
+    return PNG_SIGNATURE + _chunk(b'IHDR', ihdr) + _chunk(b'IDAT', idat) + _chunk(b'IEND', b'')
+
+def _chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+def _filter_rows(raw, filter_name, bytes_per_pixel):
+    """
+    Return the filtered scanlines, each prefixed with its filter type byte.
+    Every PNG filter predicts from the unfiltered neighbours, so all rows are filtered at once.
+    """
+    if filter_name == 'adaptive':
+        candidates = np.stack([_apply_filter(raw, filter_type, bytes_per_pixel) for filter_type in range(5)])
+        # Usual heuristic: pick the filter whose output has the smallest sum of absolute signed bytes per row
+        scores = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+        filter_types = scores.argmin(axis=0).astype(np.uint8)
+        filtered = candidates[filter_types, np.arange(raw.shape[0])]
+    elif filter_name in FILTERS:
+        filter_types = np.full(raw.shape[0], FILTERS[filter_name], dtype=np.uint8)
+        filtered = _apply_filter(raw, FILTERS[filter_name], bytes_per_pixel)
+    else:
+        raise ValueError(f"Unknown PNG filter {filter_name!r}, expected 'adaptive' or one of {sorted(FILTERS)}")
+    return np.concatenate([filter_types[:, None], filtered], axis=1)
+
+def _apply_filter(raw, filter_type, bytes_per_pixel):
+    if filter_type == 0:
+        return raw
+    left = np.zeros_like(raw)
+    left[:, bytes_per_pixel:] = raw[:, :-bytes_per_pixel]
+    up = np.zeros_like(raw)
+    up[1:] = raw[:-1]
+    if filter_type == 1:
+        return raw - left
+    if filter_type == 2:
+        return raw - up
+    if filter_type == 3:
+        return raw - ((left.astype(np.uint16) + up) // 2).astype(np.uint8)
+
+    up_left = np.zeros_like(raw)
+    up_left[1:, bytes_per_pixel:] = raw[:-1, :-bytes_per_pixel]
+    a = left.astype(np.int16)
+    b = up.astype(np.int16)
+    c = up_left.astype(np.int16)
+    p = a + b - c
+    pa = np.abs(p - a)
+    pb = np.abs(p - b)
+    pc = np.abs(p - c)
+    predictor = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+    return raw - predictor
@@ -0,0 +1,92 @@
+"""
+Helpers for reading a GDAL band one row-strip at a time instead of calling ReadAsArray() on the whole scene.
+Peak memory of a tiler built on these stays bounded to a couple of strips regardless of the scene size.
+"""
+import os
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+
+# tracemalloc slows every allocation, so peak memory is only measured when TRACK_PEAK_MEMORY=1 is set
+TRACK_MEMORY = os.environ.get('TRACK_PEAK_MEMORY') == '1'
+
+def iter_strips(band, strip_rows):
+    """
+    Yield (row_offset, strip) for consecutive full-width windows of strip_rows rows.
+    The last strip is shorter when the band height is not a multiple of strip_rows.
+    """
+    cols = band.XSize
+    rows = band.YSize
+    for row_offset in range(0, rows, strip_rows):
+        strip_height = min(strip_rows, rows - row_offset)
+        yield row_offset, band.ReadAsArray(0, row_offset, cols, strip_height)
+
+def iter_multi_strips(band, strip_rows):
+    """
+    Yield (product_idx, row_offset, strip) for several strip heights from a single pass over the band.
+    Rows are read once into a rolling buffer that only keeps rows some product still needs, so the read volume
+    does not grow with the number of products. Strips are views into that buffer and must not be modified.
+    """
+    cols = band.XSize
+    rows = band.YSize
+    read_rows = max(strip_rows)
+    next_rows = [0] * len(strip_rows)
+    buffer = None
+    buffer_start = 0
+    buffer_end = 0
+
+    while min(next_rows) < rows:
+        chunk = band.ReadAsArray(0, buffer_end, cols, min(read_rows, rows - buffer_end))
+        buffer = chunk if buffer is None else np.concatenate([buffer, chunk])
+        buffer_end += chunk.shape[0]
+
+        for idx, strip_height in enumerate(strip_rows):
+            while next_rows[idx] < rows and (next_rows[idx] + strip_height <= buffer_end or buffer_end == rows):
+                start = next_rows[idx]
+                end = min(start + strip_height, rows)
+                yield idx, start, buffer[start - buffer_start:end - buffer_start]
+                next_rows[idx] = end
+
+        # Drop the rows every product has already consumed
+        keep_from = min(next_rows)
+        buffer = buffer[keep_from - buffer_start:]
+        buffer_start = keep_from
+
+def fill_nodata(strip, nodata, fill_value, dtype=None):
+    """
+    Replace NoData with fill_value across a whole read window in one vectorized pass.
+    The strip must be private to the caller (as returned by ReadAsArray); it is filled in place unless it first
+    has to be converted to dtype, e.g. to float32 so integer DEMs can hold a NaN fill.
+    """
+    if nodata is None:
+        return strip if dtype is None else strip.astype(dtype, copy=False)
+
+    mask = np.isnan(strip) if np.isnan(nodata) else (strip == nodata)
+    if dtype is not None and strip.dtype != dtype:
+        strip = strip.astype(dtype)
+    np.putmask(strip, mask, fill_value)
+    return strip
+
+@contextmanager
+def track_peak_memory(label, enabled=None):
+    """
+    Print the peak memory allocated through Python/NumPy (which includes every array GDAL reads) while the block runs.
+    The yielded dict receives the peak in MiB under 'peak_memory_mib' once the block exits, or None when tracking is
+    off (enabled defaults to TRACK_MEMORY).
+    """
+    stats = {'peak_memory_mib': None}
+    if not (TRACK_MEMORY if enabled is None else enabled):
+        yield stats
+        return
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield stats
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+        stats['peak_memory_mib'] = round(peak / (1024 * 1024), 1)
+        print(f"Peak memory for {label}: {stats['peak_memory_mib']:.1f} MiB")
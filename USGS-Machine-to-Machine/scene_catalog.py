@@ -0,0 +1,128 @@
+"""
+Scene catalog: finds the .bil scenes under a directory whether they are extracted files or members of the M2M
+download zips, so the tilers and mosaic builders can read straight from LandsatDOWNLOAD through GDAL's /vsizip/
+and the ExtractZips.py stage (and its copy of every scene) can be skipped.
+
+The member list of each zip is cached in SCENE_CATALOG_FILE under the source directory, together with the zip's size
+and mtime, so later runs only open new or re-downloaded archives. The catalog also maps each scene id (the .bil name
+without extension) to its archive and member; a scene id found in two archives (or as two extracted files) keeps the
+first one found and is reported as a duplicate. Subfolders are searched too unless recursive=False, which reads
+only the files and zips directly in the directory, like the glob('*.bil') the mosaic scripts used before.
+
+    for path in list_scenes(r"J:\\GDA\\GIS\\LandsatDOWNLOAD"):
+        dataset = gdal.Open(path)  # e.g. /vsizip/J:/GDA/GIS/LandsatDOWNLOAD/640811010.zip/<scene>.bil
+"""
+import json
+import os
+import sys
+import zipfile
+
+SCENE_CATALOG_FILE = 'scene_catalog.json'
+SCENE_EXTENSION = '.bil'
+DUPLICATES_SHOWN = 20  # Duplicate scene ids listed in the warning; all are saved in the catalog
+
+def vsizip_path(zip_path, member):
+    """
+    GDAL path of a member inside a zip. GDAL wants forward slashes, including after a Windows drive letter.
+    """
+    return '/vsizip/' + os.path.abspath(zip_path).replace('\\', '/') + '/' + member
+
+def source_file(path):
+    """
+    The file on disk behind a scene path: the zip for /vsizip/ paths, otherwise the path itself.
+    """
+    if path.startswith('/vsizip/'):
+        inner = path[len('/vsizip/'):]
+        return inner[:inner.lower().index('.zip/') + len('.zip')]
+    return path
+
+def load_catalog(catalog_file):
+    if os.path.exists(catalog_file):
+        with open(catalog_file, 'r') as f:
+            return json.load(f)
+    return {'archives': {}, 'scenes': {}}
+
+def save_catalog(catalog_file, catalog):
+    temp_file = catalog_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(catalog, f)
+    os.replace(temp_file, catalog_file)
+
+def catalog_path(source_directory, catalog_file=None):
+    return catalog_file or os.path.join(source_directory, SCENE_CATALOG_FILE)
+
+def build_scene_catalog(source_directory, catalog_file=None, extension=SCENE_EXTENSION, recursive=True):
+    """
+    Return {scene_id: {'path', 'archive', 'member'}} for every scene under source_directory (or, with
+    recursive=False, directly in it); 'archive' and 'member' are None for extracted files. Zips whose size and mtime
+    match the cached entry are not reopened.
+    """
+    catalog_file = catalog_path(source_directory, catalog_file)
+    catalog = load_catalog(catalog_file)
+    archives = {}
+    extracted = {}
+    zipped = {}
+    duplicates = {}
+    opened = 0
+
+    def add(found, scene_id, scene):
+        if scene_id in found:
+            duplicates.setdefault(scene_id, [found[scene_id]['path']]).append(scene['path'])
+        else:
+            found[scene_id] = scene
+
+    for root, dirs, files in os.walk(source_directory):
+        if not recursive:
+            dirs.clear()
+        for file in files:
+            file_path = os.path.join(root, file)
+            if file.lower().endswith(extension):
+                add(extracted, os.path.splitext(file)[0], {'path': file_path, 'archive': None, 'member': None})
+            elif file.lower().endswith('.zip'):
+                stat = os.stat(file_path)
+                entry = catalog['archives'].get(file_path)
+                if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+                    try:
+                        with zipfile.ZipFile(file_path, 'r') as zip_ref:
+                            members = [name for name in zip_ref.namelist() if name.lower().endswith(extension)]
+                    except zipfile.BadZipFile:
+                        print(f"Bad zip file, skipping: {file_path}")
+                        continue
+                    entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'members': members}
+                    opened += 1
+                archives[file_path] = entry
+                for member in entry['members']:
+                    scene_id = os.path.splitext(os.path.basename(member))[0]
+                    add(zipped, scene_id, {'path': vsizip_path(file_path, member), 'archive': file_path,
+                                           'member': member})
+
+    # An extracted copy of a zipped scene is read directly instead; that is not a duplicate
+    scenes = {**zipped, **extracted}
+    save_catalog(catalog_file, {'archives': archives, 'scenes': scenes, 'duplicates': duplicates})
+    print(f"Scene catalog: {len(scenes)} scenes, {len(archives)} archives ({opened} opened)")
+    if duplicates:
+        print(f"Warning: {len(duplicates)} scene ids appear more than once; the first copy is used:")
+        for scene_id, paths in sorted(duplicates.items())[:DUPLICATES_SHOWN]:
+            print(f"  {scene_id}: {', '.join(paths)}")
+    return scenes
+
+def list_scenes(source_directory, catalog_file=None, extension=SCENE_EXTENSION, recursive=True):
+    """
+    Paths GDAL (or rasterio) can open for every scene under source_directory, sorted.
+    """
+    scenes = build_scene_catalog(source_directory, catalog_file, extension, recursive)
+    return sorted(scene['path'] for scene in scenes.values())
+
+def lookup_scene(scene_id, source_directory, catalog_file=None):
+    """
+    Catalog entry of one scene from the last saved catalog of source_directory, or None.
+    """
+    return load_catalog(catalog_path(source_directory, catalog_file))['scenes'].get(scene_id)
+
+if __name__ == "__main__":
+    source_directory = r"J:\GDA\GIS\LandsatDOWNLOAD"  # Zips from M2M-Download-API, or extracted .bil files
+    if len(sys.argv) > 1:
+        for scene_id in sys.argv[1:]:
+            print(f"{scene_id}: {lookup_scene(scene_id, source_directory)}")
+    else:
+        build_scene_catalog(source_directory)
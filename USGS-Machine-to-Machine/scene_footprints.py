@@ -0,0 +1,91 @@
+"""
+Footprint index of DEM scenes: the bounds of every .bil are read once, cached to FOOTPRINT_CACHE and loaded into a
+shapely STRtree, so clipping or mosaicking a square only opens the scenes that intersect it.
+
+On later runs only scenes that are new or whose size/mtime changed are opened again; deleted scenes are dropped.
+
+    footprints = SceneFootprints.build(r"J:\\GDA\\GIS\\LandsatEXTRACT")
+    for scene in footprints.query(minx, miny, maxx, maxy):
+        print(scene['path'], scene['bounds'])
+"""
+import json
+import os
+from shapely.geometry import box
+from shapely.strtree import STRtree
+from osgeo import gdal
+from scene_catalog import list_scenes, source_file
+
+FOOTPRINT_CACHE = 'scene_footprints.json'
+
+def read_footprint(file_path):
+    """
+    Return the bounds (minx, miny, maxx, maxy) and projection of a raster, or None if it cannot be opened.
+    """
+    dataset = gdal.Open(file_path)
+    if dataset is None:
+        return None
+    transform = dataset.GetGeoTransform()
+    minx = transform[0]
+    maxx = transform[0] + transform[1] * dataset.RasterXSize
+    miny = transform[3] + transform[5] * dataset.RasterYSize
+    maxy = transform[3]
+    return {'bounds': [minx, miny, maxx, maxy], 'projection': dataset.GetProjection()}
+
+def load_cache(cache_file):
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_cache(cache_file, cache):
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(cache, f)
+    os.replace(temp_file, cache_file)
+
+class SceneFootprints:
+    def __init__(self, scenes):
+        self.scenes = scenes
+        self.tree = STRtree([box(*scene['bounds']) for scene in scenes])
+
+    @classmethod
+    def build(cls, dem_directory, cache_file=FOOTPRINT_CACHE, recursive=True):
+        """
+        Load the cached footprints, re-reading only scenes that were added or modified since the cache was written.
+        Scenes inside downloaded zips are checked against the zip's size and mtime. recursive=False only reads the
+        scenes directly in dem_directory, not its subfolders.
+        """
+        dem_files = list_scenes(dem_directory, recursive=recursive)
+        cache = load_cache(cache_file)
+
+        fresh = {}
+        scanned = 0
+        for file_path in dem_files:
+            stat = os.stat(source_file(file_path))
+            entry = cache.get(file_path)
+            if entry is None or entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size:
+                footprint = read_footprint(file_path)
+                scanned += 1
+                if footprint is None:
+                    print(f"Failed to open {file_path}")
+                    continue
+                entry = {'mtime': stat.st_mtime, 'size': stat.st_size, **footprint}
+            fresh[file_path] = entry
+
+        if scanned or len(fresh) != len(cache):
+            save_cache(cache_file, fresh)
+        print(f"Footprint index: {len(fresh)} scenes, {scanned} scanned, {len(fresh) - scanned} from {cache_file}")
+        return cls([{'path': path, **entry} for path, entry in sorted(fresh.items())])
+
+    def __len__(self):
+        return len(self.scenes)
+
+    def query(self, minx, miny, maxx, maxy):
+        """
+        Return the scenes whose footprint overlaps the bounding box (touching edges do not count).
+        """
+        hits = self.tree.query(box(minx, miny, maxx, maxy))
+        scenes = [self.scenes[idx] for idx in sorted(hits)]
+        return [scene for scene in scenes
+                if scene['bounds'][0] < maxx and scene['bounds'][2] > minx
+                and scene['bounds'][1] < maxy and scene['bounds'][3] > miny]
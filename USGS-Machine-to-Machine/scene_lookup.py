@@ -1,17 +1,9 @@
-import pickle
+from download_catalog import DownloadCatalog
 
-# Open the saved results file and load into memory
-with open('requestResults', 'rb') as inFyle:
-    requestResults = pickle.load(inFyle)
-
-lookup_dict = dict()
-for thing in requestResults['availableDownloads']:
-    # Makes a dictionary out of the results
-    downloadId = thing['downloadId']
-    downloadUrl = thing['url']
-    lookup_dict[downloadId] = downloadUrl
+# Indexed lookups in the download catalog instead of unpickling requestResults into a dict
+catalog = DownloadCatalog()
 
 
 for id in [640811415, 640801757, 640802300, 640802301, 640803306, 640803906, 640803907, 640804455, 640804461, 640804468, 640804830, 640804839, 640804888, 640804899, 640804949, 640805040, 640805391, 640805651, 640806304, 640806582, 640806814, 640807198, 640808343, 640808347, 640808354, 640808358, 640808411, 640808412, 640808421, 640808483, 640808786, 640809556, 640809793, 640809919, 640809926, 640809933, 640810178, 640807687, 640810296, 640810303, 640810387, 640810962, 640812089, 640812314, 640813179, 640814784, 640814930, 640814938, 640815076, 640815149, 640815153, 640816600, 640817480, 640817504, 640817790, 640818374, 640820117, 640820382, 640820592, 640820684]:
-    print(str(id) + ': ' + lookup_dict[id])
+    print(str(id) + ': ' + str(catalog.url(id)))
 
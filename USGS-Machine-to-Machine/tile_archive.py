@@ -0,0 +1,186 @@
+"""
+Packed tile store: an alternative to writing millions of loose tile files (plus .pgw sidecars) into one folder.
+
+Encoded tiles (PNG or GeoTIFF bytes) are appended to a few large shard files, and an SQLite index records each
+tile's shard, byte offset, length, center lat/lon and geotransform. Shards are append-only, so a crash can only
+leave unindexed bytes at the end of a shard; index rows are committed after the shard data is flushed to disk.
+
+    archive = TileArchiveReader(r"J:\\GDA\\GIS\\LandsatDEM-1kmsq-archive")
+    rows = archive.query_bbox(min_lat, min_lon, max_lat, max_lon)
+    data = archive.read_array(rows[0]['tile_id'])
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from urllib.request import pathname2url
+import numpy as np
+
+INDEX_FILE = 'index.sqlite'
+SHARD_BYTES = 4 * 1024 ** 3  # A new shard is started once the current one reaches this size
+BATCH_SIZE = 1000  # Tiles appended between index commits
+
+def _connect(directory):
+    connection = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    with connection:
+        connection.execute('CREATE TABLE IF NOT EXISTS tiles ('
+                           'tile_id TEXT PRIMARY KEY, shard INTEGER NOT NULL, offset INTEGER NOT NULL, '
+                           'length INTEGER NOT NULL, format TEXT NOT NULL, center_lat REAL NOT NULL, '
+                           'center_lon REAL NOT NULL, geotransform TEXT)')
+        connection.execute('CREATE INDEX IF NOT EXISTS tiles_center ON tiles (center_lat, center_lon)')
+    return connection
+
+def _connect_read_only(directory):
+    index_path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(index_path):
+        raise FileNotFoundError(f"No tile archive index at {index_path}")
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(index_path))}?mode=ro", uri=True,
+                           check_same_thread=False)
+
+def shard_path(directory, shard):
+    return os.path.join(directory, f"shard_{shard:05d}.bin")
+
+class TileArchiveWriter:
+    """
+    Single writer for an archive directory. add() is thread-safe so it can be called from pool callbacks.
+    """
+    def __init__(self, directory, shard_bytes=SHARD_BYTES, batch_size=BATCH_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending = []
+        self.connection = _connect(directory)
+        self.tile_ids = {row[0] for row in self.connection.execute('SELECT tile_id FROM tiles')}
+
+        # Keep appending to the last shard; bytes after its last indexed tile were never committed, so cut them off,
+        # and remove any shard started after it, which holds only uncommitted bytes
+        last = self.connection.execute('SELECT shard, MAX(offset + length) FROM tiles '
+                                       'WHERE shard = (SELECT MAX(shard) FROM tiles)').fetchone()
+        self.shard = last[0] if last[0] is not None else 0
+        later = self.shard + 1
+        while os.path.exists(shard_path(directory, later)):
+            os.remove(shard_path(directory, later))
+            later += 1
+        self.shard_file = open(shard_path(directory, self.shard), 'ab')
+        self.shard_file.truncate(last[1] or 0)
+        self.shard_file.seek(0, os.SEEK_END)
+
+    def contains(self, tile_id):
+        return tile_id in self.tile_ids
+
+    def add(self, tile_id, data, file_format, center_lat, center_lon, geotransform=None):
+        with self.lock:
+            if tile_id in self.tile_ids:
+                return
+            if self.shard_file.tell() + len(data) > self.shard_bytes and self.shard_file.tell() > 0:
+                self._flush_locked()
+                self.shard_file.close()
+                self.shard += 1
+                self.shard_file = open(shard_path(self.directory, self.shard), 'ab')
+
+            offset = self.shard_file.tell()
+            self.shard_file.write(data)
+            self.pending.append((tile_id, self.shard, offset, len(data), file_format, center_lat, center_lon,
+                                 json.dumps(list(geotransform)) if geotransform is not None else None))
+            self.tile_ids.add(tile_id)
+            if len(self.pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        self.shard_file.flush()
+        os.fsync(self.shard_file.fileno())
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.shard_file.close()
+        self.connection.close()
+
+class TileArchiveReader:
+    """
+    Random-access reads by tile id, center coordinate or bounding box. The index is opened read-only.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.connection = _connect_read_only(directory)
+        self.connection.row_factory = sqlite3.Row
+        self.shard_files = {}
+        self.lock = threading.Lock()
+
+    def lookup(self, tile_id):
+        row = self.connection.execute('SELECT * FROM tiles WHERE tile_id = ?', (tile_id,)).fetchone()
+        if row is None:
+            raise KeyError(tile_id)
+        return row
+
+    def get(self, tile_id):
+        """
+        Return the encoded tile exactly as it would have been written to its own file.
+        """
+        row = self.lookup(tile_id)
+        with self.lock:
+            shard_file = self.shard_files.get(row['shard'])
+            if shard_file is None:
+                shard_file = open(shard_path(self.directory, row['shard']), 'rb')
+                self.shard_files[row['shard']] = shard_file
+            shard_file.seek(row['offset'])
+            return shard_file.read(row['length'])
+
+    def find(self, lat, lon, tolerance=1e-6):
+        """
+        Return the tile whose center is at (lat, lon), or None.
+        """
+        return self.connection.execute(
+            'SELECT * FROM tiles WHERE center_lat BETWEEN ? AND ? AND center_lon BETWEEN ? AND ?',
+            (lat - tolerance, lat + tolerance, lon - tolerance, lon + tolerance)).fetchone()
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """
+        Return the tiles whose centers fall inside the bounding box.
+        """
+        return self.connection.execute(
+            'SELECT * FROM tiles WHERE center_lat BETWEEN ? AND ? AND center_lon BETWEEN ? AND ? '
+            'ORDER BY center_lat DESC, center_lon', (min_lat, max_lat, min_lon, max_lon)).fetchall()
+
+    def geotransform(self, tile_id):
+        value = self.lookup(tile_id)['geotransform']
+        return tuple(json.loads(value)) if value is not None else None
+
+    def read_array(self, tile_id):
+        """
+        Decode a tile to a NumPy array.
+        """
+        row = self.lookup(tile_id)
+        data = self.get(tile_id)
+        if row['format'] == 'PNG':
+            from PIL import Image
+            return np.array(Image.open(io.BytesIO(data)))
+
+        from osgeo import gdal
+        vsi_path = f"/vsimem/{uuid.uuid4().hex}.tif"
+        gdal.FileFromMemBuffer(vsi_path, data)
+        try:
+            dataset = gdal.Open(vsi_path)
+            array = dataset.GetRasterBand(1).ReadAsArray()
+            dataset = None
+        finally:
+            gdal.Unlink(vsi_path)
+        return array
+
+    def close(self):
+        for shard_file in self.shard_files.values():
+            shard_file.close()
+        self.connection.close()
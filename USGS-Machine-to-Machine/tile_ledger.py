@@ -0,0 +1,109 @@
+"""
+Durable per-tile completion ledger for the tilers, replacing the positional checkpoint.json counters.
+
+Completed tiles are keyed by scene path + tile id and written to SQLite (WAL mode) in batched transactions,
+so resuming does not depend on os.walk order and skips finished tiles with an in-memory set lookup.
+Every process opens its own TileLedger; within a process the ledger can be shared between writer threads.
+
+Run this file with a ledger path to print what is left.
+"""
+import os
+import sqlite3
+import sys
+import threading
+
+LEDGER_FILE = 'tile_ledger.sqlite'
+BATCH_SIZE = 500  # Tiles buffered before they are committed in one transaction
+BUSY_TIMEOUT = 300  # Seconds a writer waits for another process's transaction to finish
+
+class TileLedger:
+    def __init__(self, path=LEDGER_FILE, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS scenes ('
+                                    'scene TEXT PRIMARY KEY, total_tiles INTEGER, done INTEGER NOT NULL DEFAULT 0)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS tiles ('
+                                    'scene TEXT NOT NULL, tile TEXT NOT NULL, PRIMARY KEY (scene, tile)) WITHOUT ROWID')
+
+    def register_scenes(self, scenes):
+        """
+        Record the scenes of a run so remaining() can report the ones that were never started.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO scenes (scene) VALUES (?)', [(scene,) for scene in scenes])
+
+    def start_scene(self, scene, total_tiles):
+        with self.lock, self.connection:
+            self.connection.execute('INSERT INTO scenes (scene, total_tiles) VALUES (?, ?) '
+                                    'ON CONFLICT(scene) DO UPDATE SET total_tiles = excluded.total_tiles',
+                                    (scene, total_tiles))
+
+    def completed_scenes(self):
+        with self.lock:
+            return {row[0] for row in self.connection.execute('SELECT scene FROM scenes WHERE done = 1')}
+
+    def completed_tiles(self, scene):
+        with self.lock:
+            return {row[0] for row in self.connection.execute('SELECT tile FROM tiles WHERE scene = ?', (scene,))}
+
+    def mark_tile(self, scene, tile):
+        with self.lock:
+            self.pending.append((scene, tile))
+            if len(self.pending) >= self.batch_size:
+                self._flush_locked()
+
+    def mark_scene_done(self, scene):
+        with self.lock:
+            self._flush_locked()
+            with self.connection:
+                self.connection.execute('UPDATE scenes SET done = 1 WHERE scene = ?', (scene,))
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO tiles (scene, tile) VALUES (?, ?)', self.pending)
+        self.pending = []
+
+    def remaining(self):
+        """
+        Return (scene, total_tiles, completed_tiles) for every scene that is not finished.
+        total_tiles is None for scenes that have not been started yet.
+        """
+        with self.lock:
+            self._flush_locked()
+            return self.connection.execute(
+                'SELECT s.scene, s.total_tiles, COUNT(t.tile) FROM scenes s '
+                'LEFT JOIN tiles t ON t.scene = s.scene WHERE s.done = 0 '
+                'GROUP BY s.scene ORDER BY s.scene').fetchall()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+def print_remaining(path=LEDGER_FILE):
+    if not os.path.exists(path):
+        print(f"No ledger at {path}")
+        return
+    ledger = TileLedger(path)
+    remaining = ledger.remaining()
+    done_scenes = len(ledger.completed_scenes())
+    ledger.close()
+
+    for scene, total_tiles, completed in remaining:
+        total = '?' if total_tiles is None else total_tiles
+        print(f"{scene}: {completed}/{total} tiles")
+    print(f"Scenes finished: {done_scenes}, left: {len(remaining)}")
+
+if __name__ == "__main__":
+    print_remaining(sys.argv[1] if len(sys.argv) > 1 else LEDGER_FILE)
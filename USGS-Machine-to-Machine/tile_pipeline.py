@@ -0,0 +1,81 @@
+"""
+Bounded producer/consumer pool for CPU-bound tile encoders.
+
+The slicer hands tiles to worker processes through submit(), which blocks once queue_depth tiles are in flight,
+so memory stays flat no matter how much faster the slicer is than the encoders.
+"""
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+class BoundedProcessPool:
+    def __init__(self, workers, queue_depth, initializer=None, initargs=()):
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+        self.slots = threading.BoundedSemaphore(queue_depth)
+        self.errors_lock = threading.Lock()
+        self.callback_errors = []
+
+    def submit(self, fn, *args, on_success=None, on_result=None, task_id=None):
+        """
+        Queue fn(*args) on a worker, waiting for a free slot first. on_success() is called in this
+        process once the tile has been written, e.g. to record it in the ledger; on_result(result)
+        receives the worker's return value, e.g. encoded bytes to append to an archive.
+
+        The returned future completes only after the callbacks have run, and holds the worker's or the
+        callback's exception, so waiting on it means the tile is also recorded. Its result is None when
+        on_result consumed the return value, so callers that keep the futures of a whole scene do not keep
+        every encoded tile in memory. task_id (e.g. the tile id) labels failures in the log.
+        """
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        outer = Future()
+        outer.set_running_or_notify_cancel()
+        label = task_id if task_id is not None else fn.__name__
+        future.add_done_callback(lambda f: self._finished(f, outer, label, on_success, on_result))
+        return outer
+
+    def _finished(self, future, outer, label, on_success, on_result):
+        self.slots.release()
+        try:
+            result = future.result()
+        except BaseException as e:
+            print(f"Task {label} failed: {e!r}")
+            outer.set_exception(e)
+            return
+        try:
+            if on_result is not None:
+                on_result(result)
+            if on_success is not None:
+                on_success()
+        except Exception as e:
+            # Exceptions raised in a done-callback are only logged by concurrent.futures, so keep them for shutdown()
+            print(f"Recording task {label} failed: {e!r}")
+            with self.errors_lock:
+                self.callback_errors.append((label, e))
+            outer.set_exception(e)
+            return
+        outer.set_result(None if on_result is not None else result)
+
+    def shutdown(self):
+        """
+        Wait for the workers and re-raise the first exception from an on_result/on_success callback, since
+        a failed archive or ledger write means the output is not what the ledger says.
+        """
+        self.executor.shutdown(wait=True)
+        if self.callback_errors:
+            label, error = self.callback_errors[0]
+            raise RuntimeError(f"{len(self.callback_errors)} task callbacks failed, "
+                               f"first for {label}: {error!r}") from error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.shutdown()
+        else:
+            # Do not mask the exception that is already propagating
+            self.executor.shutdown(wait=True)
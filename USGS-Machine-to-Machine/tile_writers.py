@@ -0,0 +1,138 @@
+"""
+Tile writers shared by the 1 km GeoTIFF tiler, the 0.1 degree PNG tilers and the multi-product tiler.
+They are module-level functions so they can run in worker processes.
+"""
+import uuid
+import numpy as np
+from osgeo import gdal
+from png_encoder import encode_png, write_png
+
+# GeoTIFF output mode. The defaults write today's uncompressed, striped Float32 squares.
+DEFAULT_GTIFF_OPTIONS = {
+    'compress': None,  # 'DEFLATE', 'ZSTD' or 'LZW'
+    'level': None,  # Compression level (DEFLATE 1-12, ZSTD 1-22); None uses GDAL's default
+    'predictor': True,  # Floating-point predictor (3) for Float32, horizontal differencing (2) for Int16
+    'tiled': False,  # Internal tiling instead of strips
+    'block_size': 256,
+    'overviews': [],  # Overview factors, e.g. [2, 4]
+    'cog': False,  # Write a Cloud-optimized GeoTIFF through the COG driver
+    'data_type': 'Float32',  # 'Float32', or 'Int16' storing round((value - offset) / scale)
+    'scale': 1.0,
+    'offset': 0.0,
+}
+
+INT16_NODATA = -32768
+
+def gtiff_creation_options(options, data_type):
+    """
+    Translate a GeoTIFF output mode into GDAL creation options for the GTiff or COG driver.
+    """
+    creation_options = []
+    if options['compress']:
+        creation_options.append(f"COMPRESS={options['compress']}")
+        if options['level'] is not None:
+            if options['cog']:
+                creation_options.append(f"LEVEL={options['level']}")
+            else:
+                level_key = {'DEFLATE': 'ZLEVEL', 'ZSTD': 'ZSTD_LEVEL'}.get(options['compress'].upper())
+                if level_key:
+                    creation_options.append(f"{level_key}={options['level']}")
+        if options['predictor'] and options['compress'].upper() != 'NONE':
+            if options['cog']:
+                creation_options.append('PREDICTOR=YES')
+            else:
+                creation_options.append('PREDICTOR=3' if data_type == gdal.GDT_Float32 else 'PREDICTOR=2')
+
+    if options['cog']:
+        if not options['compress']:
+            # The COG driver compresses with LZW unless told otherwise
+            creation_options.append('COMPRESS=NONE')
+        creation_options.append(f"BLOCKSIZE={options['block_size']}")
+        creation_options.append('OVERVIEWS=AUTO' if options['overviews'] else 'OVERVIEWS=NONE')
+    elif options['tiled']:
+        creation_options += ['TILED=YES', f"BLOCKXSIZE={options['block_size']}", f"BLOCKYSIZE={options['block_size']}"]
+    return creation_options
+
+def scale_to_int16(subset, nodata, scale, offset):
+    """
+    Store elevations as Int16 (value = stored * scale + offset); NaN and NoData become INT16_NODATA.
+    """
+    missing = np.isnan(subset)
+    if nodata is not None and not np.isnan(nodata):
+        missing |= subset == nodata
+    scaled = np.round((np.where(missing, offset, subset) - offset) / scale)
+    scaled = np.clip(scaled, INT16_NODATA + 1, np.iinfo(np.int16).max).astype(np.int16)
+    scaled[missing] = INT16_NODATA
+    return scaled
+
+def write_geotiff(subset, output_path, projection, geotransform, nodata, gtiff_options=None):
+    options = {**DEFAULT_GTIFF_OPTIONS, **(gtiff_options or {})}
+    if options['data_type'] == 'Int16':
+        subset = scale_to_int16(subset, nodata, options['scale'], options['offset'])
+        nodata = INT16_NODATA
+        data_type = gdal.GDT_Int16
+    elif options['data_type'] == 'Float32':
+        data_type = gdal.GDT_Float32
+    else:
+        raise ValueError(f"Unknown GeoTIFF data_type {options['data_type']!r}, expected 'Float32' or 'Int16'")
+    creation_options = gtiff_creation_options(options, data_type)
+
+    # The COG driver can only copy an existing dataset, so build the square in memory first
+    driver = gdal.GetDriverByName('MEM' if options['cog'] else 'GTiff')
+    if options['cog']:
+        out_raster = driver.Create('', subset.shape[1], subset.shape[0], 1, data_type)
+    else:
+        out_raster = driver.Create(output_path, subset.shape[1], subset.shape[0], 1, data_type, options=creation_options)
+    out_raster.SetGeoTransform(geotransform)
+    out_raster.SetProjection(projection)
+    outband = out_raster.GetRasterBand(1)
+    outband.WriteArray(subset)
+    if nodata is not None:
+        outband.SetNoDataValue(nodata)
+    if options['data_type'] == 'Int16':
+        outband.SetScale(options['scale'])
+        outband.SetOffset(options['offset'])
+    outband.FlushCache()
+
+    if options['cog']:
+        gdal.GetDriverByName('COG').CreateCopy(output_path, out_raster, options=creation_options)
+    elif options['overviews']:
+        out_raster.BuildOverviews('AVERAGE', options['overviews'])
+    out_raster = None
+
+def encode_geotiff(subset, projection, geotransform, nodata, gtiff_options=None):
+    """
+    Return the bytes write_geotiff would have written, for packing into a tile archive.
+    """
+    vsi_path = f"/vsimem/{uuid.uuid4().hex}.tif"
+    write_geotiff(subset, vsi_path, projection, geotransform, nodata, gtiff_options)
+    try:
+        f = gdal.VSIFOpenL(vsi_path, 'rb')
+        size = gdal.VSIStatL(vsi_path).size
+        data = gdal.VSIFReadL(1, size, f)
+        gdal.VSIFCloseL(f)
+    finally:
+        gdal.Unlink(vsi_path)
+    return data
+
+def encode_png_tile(subset, png_options=None):
+    return encode_png(subset.astype(np.uint16), png_options)
+
+def write_png_tile(subset, output_path, pgw_path, geotransform, png_options=None):
+    # Convert the array to 16-bit unsigned integer
+    subset = subset.astype(np.uint16)
+
+    # Create and save the PNG file
+    write_png(output_path, subset, png_options)
+
+    # Create and save the world file (.pgw) for georeferencing
+    write_world_file(pgw_path, geotransform)
+
+def write_world_file(path, geotransform):
+    with open(path, 'w') as f:
+        f.write(f"{geotransform[1]:.10f}\n")
+        f.write(f"{geotransform[2]:.10f}\n")
+        f.write(f"{geotransform[4]:.10f}\n")
+        f.write(f"{geotransform[5]:.10f}\n")
+        f.write(f"{geotransform[0]:.10f}\n")
+        f.write(f"{geotransform[3]:.10f}\n")
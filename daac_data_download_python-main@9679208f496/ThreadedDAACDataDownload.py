@@ -13,11 +13,15 @@
 from subprocess import Popen
 from getpass import getpass
 from netrc import netrc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 import argparse
 import time
 import os
 import requests
 import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 # ----------------------------------USER-DEFINED VARIABLES--------------------------------------- #
@@ -43,6 +47,11 @@ elif isinstance(files, str):
 if saveDir[-1] != '/' and saveDir[-1] != '\\':
     saveDir = saveDir.strip("'").strip('"') + os.sep
 urs = 'urs.earthdata.nasa.gov'    # Address to call for authentication
+maxWorkers = 8                    # Concurrent downloads; one pooled connection each
+chunkSize = 1024 * 1024           # Bytes read from the socket at a time
+writeBuffer = 8 * 1024 * 1024     # File buffer, so the disk sees a few large writes
+verifySSL = False                 # As before; set True once the certificate chain is trusted locally
+completedLog = 'completed.txt'    # "<file name> <size>" per finished download, in saveDir
 
 # --------------------------------AUTHENTICATION CONFIGURATION----------------------------------- #
 # Determine if netrc file exists, and if so, if it includes NASA Earthdata Login Credentials
@@ -73,40 +82,143 @@ while tries < 30:
         time.sleep(2.0)
     tries += 1
 
+# Read the credentials once instead of re-parsing ~/.netrc for every request
+username, _, password = netrc(netrcDir).authenticators(urs)
+
 # -----------------------------------------DOWNLOAD FILE(S)-------------------------------------- #
+class EarthdataSession(requests.Session):
+    """
+    Keeps the Earthdata Login credentials on same-host redirects and on any redirect to or from urs, including urs
+    sending the request back to the data server; they are only dropped on redirects between two other hosts, e.g.
+    from a data server to its cloud storage. The session keeps the login cookies across files.
+    """
+    def rebuild_auth(self, prepared_request, response):
+        headers = prepared_request.headers
+        if 'Authorization' in headers:
+            original = urlparse(response.request.url).hostname
+            redirect = urlparse(prepared_request.url).hostname
+            if original != redirect and redirect != urs and original != urs:
+                del headers['Authorization']
+
+def make_session():
+    session = EarthdataSession()
+    session.auth = (username, password)
+    session.verify = verifySSL
+    retry = Retry(total=5, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=maxWorkers, pool_maxsize=maxWorkers, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def load_completed(path):
+    completed = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.rsplit(' ', 1)
+                if len(parts) == 2 and parts[1].strip().isdigit():
+                    completed[parts[0]] = int(parts[1])
+    return completed
+
+completedLock = threading.Lock()
+
+def record_completed(path, name, size):
+    with completedLock:
+        with open(path, 'a') as f:
+            f.write('{} {}\n'.format(name, size))
+
+def expected_total(response):
+    """
+    Full size of the file from Content-Range ('bytes 0-99/1234' or 'bytes */1234') or, for a plain 200, from
+    Content-Length; None when the server does not say or the body is content-encoded.
+    """
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    if response.status_code == 200 and 'Content-Encoding' not in response.headers:
+        length = response.headers.get('Content-Length', '')
+        return int(length) if length.isdigit() else None
+    return None
+
 # Function to download a single file
-def download_file(url, save_name):
-    with requests.get(url.strip(), verify=False, stream=True, auth=(netrc(netrcDir).authenticators(urs)[0], netrc(netrcDir).authenticators(urs)[2])) as response:
-        if response.status_code != 200:
-            print("{} not downloaded. Verify that your username and password are correct in {}".format(url.split('/')[-1].strip(), netrcDir))
-        else:
-            response.raw.decode_content = True
-            content = response.raw
-            with open(save_name, 'wb') as d:
-                while True:
-                    chunk = content.read(16 * 1024)
-                    if not chunk:
-                        break
+def download_file(session, url, save_name):
+    """
+    Download to save_name + '.part' and rename when complete. A partial file (or a file from an older run that
+    was never recorded as complete) is resumed with a Range request; a 416 reply means it is already whole if its
+    size matches the total in Content-Range. A file whose size does not match the expected total stays a .part.
+    """
+    url = url.strip()
+    part_name = save_name + '.part'
+    if os.path.exists(save_name) and not os.path.exists(part_name):
+        os.replace(save_name, part_name)
+    offset = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+    headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+
+    with session.get(url, stream=True, headers=headers, timeout=(30, 300)) as response:
+        total = expected_total(response)
+        if response.status_code == 416:
+            if total is None or total != offset:
+                print("{}: server rejected resuming at {} bytes of {}, keeping {}".format(
+                    url.split('/')[-1], offset, total, part_name))
+                return None
+            os.replace(part_name, save_name)
+            return offset
+        if response.status_code not in (200, 206):
+            print("{} not downloaded (HTTP {}). Verify that your username and password are correct in {}".format(
+                url.split('/')[-1], response.status_code, netrcDir))
+            return None
+        if offset and response.status_code != 206:
+            offset = 0  # Server ignored the Range header, start over
+        with open(part_name, 'ab' if offset else 'wb', buffering=writeBuffer) as d:
+            for chunk in response.iter_content(chunk_size=chunkSize):
+                if chunk:
                     d.write(chunk)
-            print('Downloaded file: {}'.format(save_name))
-
-# Create a list to hold the threads
-threads = []
 
-
-# Loop through and create a thread for each file to download
+    size = os.path.getsize(part_name)
+    if total is not None and size != total:
+        # The stream ended early (or ran long); keep the .part so the next run resumes or restarts it
+        print("{}: received {} of {} bytes, keeping {}".format(url.split('/')[-1], size, total, part_name))
+        return None
+    os.replace(part_name, save_name)
+    print('Downloaded file: {}'.format(save_name))
+    return size
+
+if not os.path.exists(saveDir):
+    os.makedirs(saveDir)
+completedPath = os.path.join(saveDir, completedLog)
+completed = load_completed(completedPath)
+
+# Skip files recorded as complete whose size still matches
+todo = []
 for f in fileList:
-    if not os.path.exists(saveDir):
-        os.makedirs(saveDir)
-    saveName = os.path.join(saveDir, f.split('/')[-1].strip())
-
-    # Create and start the thread
-    t = threading.Thread(target=download_file, args=(f, saveName))
-    t.start()
-
-    # Add the thread to the list
-    threads.append(t)
+    if not f.strip():
+        continue
+    name = f.split('/')[-1].strip()
+    saveName = os.path.join(saveDir, name)
+    if name in completed and os.path.exists(saveName) and os.path.getsize(saveName) == completed[name]:
+        continue
+    todo.append((f, name, saveName))
+print('{} of {} files already downloaded, {} to go on {} workers'.format(len(fileList) - len(todo), len(fileList), len(todo), maxWorkers))
+
+# A bounded pool of workers sharing one authenticated session, instead of one thread and socket per file
+session = make_session()
+failed = []
+with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+    futures = {executor.submit(download_file, session, f, saveName): (name, f) for f, name, saveName in todo}
+    for future in as_completed(futures):
+        name, f = futures[future]
+        try:
+            size = future.result()
+        except Exception as e:
+            size = None
+            print('{} failed: {}'.format(name, e))
+        if size is None:
+            failed.append(f.strip())
+        else:
+            record_completed(completedPath, name, size)
+session.close()
 
-# Wait for all threads to complete
-for t in threads:
-    t.join()
+print('Finished: {} downloaded, {} failed'.format(len(todo) - len(failed), len(failed)))
+for f in failed:
+    print(f)
@@ -0,0 +1,57 @@
+"""
+Compare PNG encode time vs output size on a sample of our DEM tiles, to choose PNG_OPTIONS for a tiling job.
+Every encoded tile is decoded again and checked against the source so only lossless, readable settings are reported.
+"""
+import io
+import os
+import random
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'USGS-Machine-to-Machine'))
+from png_encoder import encode_png
+
+SAMPLE_SIZE = 200  # Tiles drawn at random from the tile directory
+
+CANDIDATES = [
+    {'backend': 'pillow'},  # Today's output
+    {'backend': 'pillow', 'compress_level': 1},
+    {'backend': 'pillow', 'compress_level': 9},
+    {'backend': 'numpy', 'filter': 'adaptive', 'compress_level': 6},
+    {'backend': 'numpy', 'filter': 'up', 'compress_level': 1},
+    {'backend': 'numpy', 'filter': 'up', 'compress_level': 3},
+    {'backend': 'numpy', 'filter': 'paeth', 'compress_level': 1},
+    {'backend': 'numpy', 'filter': 'paeth', 'compress_level': 6},
+    {'backend': 'numpy', 'filter': 'paeth', 'compress_level': 3, 'strategy': 'filtered'},
+    {'backend': 'numpy', 'filter': 'up', 'compress_level': 3, 'strategy': 'rle'},
+]
+
+def load_sample(tile_directory, sample_size=SAMPLE_SIZE, seed=0):
+    tiles = [os.path.join(tile_directory, f) for f in os.listdir(tile_directory) if f.endswith('.png')]
+    random.Random(seed).shuffle(tiles)
+    return [np.array(Image.open(path)).astype(np.uint16) for path in tiles[:sample_size]]
+
+def benchmark(tiles, candidates=CANDIDATES):
+    raw_bytes = sum(tile.nbytes for tile in tiles)
+    print(f"{len(tiles)} tiles, {raw_bytes / (1024 * 1024):.1f} MiB uncompressed")
+    print(f"{'options':<90} {'ms/tile':>8} {'MiB':>9} {'ratio':>6}")
+    for options in candidates:
+        encoded_bytes = 0
+        start = time.perf_counter()
+        encoded = [encode_png(tile, options) for tile in tiles]
+        elapsed = time.perf_counter() - start
+
+        for tile, data in zip(tiles, encoded):
+            encoded_bytes += len(data)
+            decoded = np.array(Image.open(io.BytesIO(data))).astype(np.uint16)
+            if not np.array_equal(decoded, tile):
+                raise ValueError(f"Round trip failed for {options}")
+
+        print(f"{str(options):<90} {elapsed * 1000 / len(tiles):8.2f} "
+              f"{encoded_bytes / (1024 * 1024):9.2f} {raw_bytes / encoded_bytes:6.2f}")
+
+if __name__ == "__main__":
+    tile_directory = r"C:\Landsat-OneTenthDegSqs"  # Change this to a folder of existing 0.1 degree PNG tiles
+    benchmark(load_sample(tile_directory))
@@ -1,9 +1,14 @@
 import os
+import sys
 import gdal
 import numpy as np
-from PIL import Image
 
-def geotiff_to_png(input_folder, output_folder):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'USGS-Machine-to-Machine'))
+from png_encoder import DEFAULT_PNG_OPTIONS, write_png
+
+PNG_OPTIONS = dict(DEFAULT_PNG_OPTIONS)  # Encoder backend, zlib level/strategy and row filter; see benchmark_png_encoder.py
+
+def geotiff_to_png(input_folder, output_folder, png_options=PNG_OPTIONS):
     # Make sure output folder exists
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -25,12 +30,9 @@ def geotiff_to_png(input_folder, output_folder):
         # Convert to uint16
         raster_uint16 = np.uint16(raster)
 
-        # Create PNG image
-        image = Image.fromarray(raster_uint16)
-
         # Save PNG file
         png_file = os.path.splitext(tiff_file)[0] + '.png'
-        image.save(os.path.join(output_folder, png_file), format='PNG')
+        write_png(os.path.join(output_folder, png_file), raster_uint16, png_options)
 
         print(f"Converted {tiff_file} to {png_file}")
 